@@ -4,25 +4,222 @@ SQLModel async engine setup with SQLite (easily switchable to PostgreSQL)
 """
 
 import os
+from sqlalchemy import event, inspect, literal, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from contextlib import contextmanager
 
 # Database URL - SQLite for development, PostgreSQL for production
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./voca.db")
 
-# Create engine
-connect_args = {"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+# Async drivers used by the API for each sync URL scheme
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Rewrite a sync database URL to use its async driver"""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Connection pool for server databases (SQLite uses SQLAlchemy's defaults)
+POOL_OPTIONS = {} if IS_SQLITE else {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": True,
+}
+
+# SQLite storage profile: "production" switches to WAL with tuned pragmas,
+# a pool of read-only connections and a single writer connection
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default").lower()
+SQLITE_PRODUCTION = IS_SQLITE and SQLITE_PROFILE == "production"
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # readers no longer block on the writer
+    "synchronous": "NORMAL",  # fsync at checkpoints only, safe with WAL
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),  # bytes
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),  # milliseconds
+}
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+SQLITE_WRITE_TIMEOUT = float(os.getenv("SQLITE_WRITE_TIMEOUT", "30"))  # seconds waiting for the writer
+
+
+def apply_sqlite_pragmas(target_engine, read_only: bool = False):
+    """Run the production pragmas on every new connection of an engine"""
+    @event.listens_for(target_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            # Switching the journal mode needs a write lock; the writer does it
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+# Sync engine - used by scripts (seed data, importers)
+connect_args = {"check_same_thread": False} if IS_SQLITE else {}
 engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
 
+if SQLITE_PRODUCTION:
+    # One writer connection: mutations queue in the pool instead of
+    # failing with "database is locked"
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, echo=False,
+        pool_size=1, max_overflow=0, pool_timeout=SQLITE_WRITE_TIMEOUT
+    )
+    read_engine = create_async_engine(
+        ASYNC_DATABASE_URL, echo=False,
+        pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0
+    )
+    apply_sqlite_pragmas(engine)
+    apply_sqlite_pragmas(async_engine.sync_engine)
+    apply_sqlite_pragmas(read_engine.sync_engine, read_only=True)
+else:
+    # Async engine - used by the API so queries never block the event loop
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **POOL_OPTIONS)
+    read_engine = async_engine
+
+async_session_maker = async_sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+read_session_maker = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+# Cleanup that must run before an index can be added to an existing table
+PRE_INDEX_FIXUPS = {
+    # Keep only the newest progress row per (user, word)
+    "ix_userprogress_user_word": (
+        "DELETE FROM userprogress WHERE id NOT IN "
+        "(SELECT MAX(id) FROM userprogress GROUP BY user_id, word_id)"
+    ),
+    # Words practised before scheduling existed are due right away
+    "ix_userprogress_user_due": (
+        "UPDATE userprogress SET next_due = last_reviewed "
+        "WHERE next_due IS NULL AND mastery_count < 3"
+    ),
+}
+
+
+def _table_backfills():
+    """Data to copy into a table the first time it is created"""
+    from services.word_levels import backfill_word_levels
+    return {"wordlevel": backfill_word_levels}
+
+
+# One-off data fixes already applied to this database, by name
+MIGRATION_LOG_DDL = "CREATE TABLE IF NOT EXISTS schemamigration (name VARCHAR(200) PRIMARY KEY)"
+
+
+def _column_default(column, dialect):
+    """SQL literal of a column's server or scalar Python default, or None"""
+    if column.server_default is not None:
+        return str(column.server_default.arg)
+    if column.default is not None and column.default.is_scalar:
+        return str(literal(column.default.arg).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    return None
+
+
+def migrate(conn):
+    """
+    Create missing tables, then bring existing ones up to the models
+
+    Only additive changes are applied: new columns (nullable or with a
+    default), new indexes, and backfills for newly created tables.
+    """
+    import models  # noqa: F401 - registers every table on SQLModel.metadata
+    
+    existing_tables = set(inspect(conn).get_table_names())
+    SQLModel.metadata.create_all(conn)
+    for table_name, backfill in _table_backfills().items():
+        if existing_tables and table_name not in existing_tables:
+            backfill(conn)
+
+    conn.exec_driver_sql(MIGRATION_LOG_DDL)
+    applied = {row[0] for row in conn.exec_driver_sql("SELECT name FROM schemamigration")}
+
+    inspector = inspect(conn)
+    for table in SQLModel.metadata.sorted_tables:
+        columns = {c["name"]: c for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            default = _column_default(column, conn.dialect)
+            fix = f"default:{table.name}.{column.name}"
+            if column.name in columns:
+                # Added by an earlier migrate() that left out Python defaults
+                if (
+                    columns[column.name]["nullable"] and not column.nullable
+                    and default is not None and fix not in applied
+                ):
+                    conn.exec_driver_sql(
+                        f"UPDATE {table.name} SET {column.name} = {default} WHERE {column.name} IS NULL"
+                    )
+                    conn.execute(text("INSERT INTO schemamigration (name) VALUES (:name)"), {"name": fix})
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+                # Existing rows take the default, nothing to backfill later
+                conn.execute(text("INSERT INTO schemamigration (name) VALUES (:name)"), {"name": fix})
+            conn.exec_driver_sql(ddl)
+
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in indexes:
+                continue
+            if index.name in PRE_INDEX_FIXUPS:
+                conn.exec_driver_sql(PRE_INDEX_FIXUPS[index.name])
+            index.create(conn)
+
+    from services.sync import ensure_sync_versions
+    from services.word_search import ensure_word_fts
+    ensure_word_fts(conn)
+    ensure_sync_versions(conn)
+
 
 def create_db_and_tables():
     """Create all tables defined in models"""
-    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        migrate(conn)
+
+
+async def init_db():
+    """Create all tables through the async engine (API startup)"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(migrate)
+
+
+def upsert(table):
+    """INSERT builder with ON CONFLICT support for the configured database"""
+    dialect = sqlite if IS_SQLITE else postgresql
+    return dialect.insert(table)
+
+
+async def close_db():
+    """Release pooled connections (API shutdown)"""
+    if read_engine is not async_engine:
+        await read_engine.dispose()
+    await async_engine.dispose()
 
 
 @contextmanager
 def get_session():
-    """Dependency for getting database session"""
+    """Synchronous session for scripts"""
     session = Session(engine)
     try:
         yield session
@@ -34,7 +231,18 @@ def get_session():
         session.close()
 
 
-def get_db():
-    """FastAPI dependency for database session"""
-    with get_session() as session:
+async def get_db():
+    """FastAPI dependency for an async database session (the writer)"""
+    async with async_session_maker() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def get_read_db():
+    """FastAPI dependency for a read-only session (endpoints that never write)"""
+    async with read_session_maker() as session:
         yield session
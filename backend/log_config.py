@@ -0,0 +1,90 @@
+"""
+Voca 语刻 - Logging
+Leveled logging for the API. Records are handed to a queue and written by a
+background thread, so request handlers never block on stdout.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+
+# Libraries that log every query or HTTP call; kept at WARNING whatever LOG_LEVEL says
+QUIET_LOGGERS = ("aiosqlite", "httpcore", "httpx", "openai")
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    """`time LEVEL [logger] message key=value ...`"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, extra fields included"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extra_fields(record)
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Route the root logger through a QueueHandler; a QueueListener thread
+    formats records and writes them to stderr. Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
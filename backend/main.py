@@ -3,11 +3,29 @@ Voca 语刻 (Voca Engrave) - Backend API
 FastAPI application for vocabulary learning with "3次刻印" mastery system
 """
 
+import logging
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from database import create_db_and_tables
+from database import async_engine, async_session_maker, close_db, init_db, read_engine
+from log_config import setup_logging
+from responses import StreamSafeGZipMiddleware
 from routers.learning import router as learning_router
+from routers.sync import router as sync_router
+from routers.words import router as words_router
+from services.lemma_index import lemma_index
+from services.llm_client import llm
+from services.metrics import METRICS_ENABLED, MetricsMiddleware, metrics
+from services.progress_buffer import PROGRESS_BUFFER_ENABLED, progress_buffer
+from services.session_prefetch import session_prefetch
+from services.story_prefetch import story_prefetch
+from services.word_catalog import word_catalog
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(
@@ -27,16 +45,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses larger than GZIP_MIN_SIZE bytes (SSE streams are left alone)
+if os.getenv("GZIP_ENABLED", "true").lower() in ("1", "true", "yes"):
+    app.add_middleware(
+        StreamSafeGZipMiddleware,
+        minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")),
+        compresslevel=int(os.getenv("GZIP_LEVEL", "6")),
+    )
+
+# Per-route latency and query counts (outermost, so compression is included)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=metrics)
+    metrics.instrument_engine(async_engine, "write")
+    if read_engine is not async_engine:
+        metrics.instrument_engine(read_engine, "read")
+
 # Include routers
 app.include_router(learning_router)
+app.include_router(words_router)
+app.include_router(sync_router)
 
 
 @app.on_event("startup")
 async def on_startup():
-    """Initialize database on startup"""
-    create_db_and_tables()
-    print("🚀 Voca 语刻 API started!")
-    print("📚 Database tables created/verified")
+    """Initialize database and in-memory indexes on startup"""
+    await init_db()
+    async with async_session_maker() as db:
+        await word_catalog.ensure_loaded(db)
+        await lemma_index.ensure_loaded(db)
+    if PROGRESS_BUFFER_ENABLED:
+        await progress_buffer.start()
+    logger.info("🚀 Voca 语刻 API started!")
+    logger.info("📚 Database tables created/verified")
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Drain buffered progress, release database and LLM connections on shutdown"""
+    await session_prefetch.aclose()
+    await progress_buffer.aclose()
+    await story_prefetch.aclose()
+    await word_catalog.aclose()
+    await lemma_index.aclose()
+    await llm.aclose()
+    await close_db()
 
 
 @app.get("/")
@@ -58,3 +110,9 @@ async def health_check():
         "database": "connected",
         "api": "operational"
     }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics: route latency, DB queries, LLM latency and tokens"""
+    return metrics.render()
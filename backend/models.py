@@ -1,6 +1,7 @@
 """
 Voca 语刻 - Database Models
-SQLModel schemas for Word, UserProgress, and AIStoryCache
+SQLModel schemas for Word, WordLevel, UserProgress, UserStats, AIStoryCache,
+and PrefetchedSession
 """
 
 from datetime import datetime
@@ -8,7 +9,7 @@ from typing import Optional
 from sqlmodel import SQLModel, Field
 
 
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, Index, JSON
 
 class Word(SQLModel, table=True):
     """词库表 - Vocabulary word entry"""
@@ -36,27 +37,77 @@ class Word(SQLModel, table=True):
     exchange: Optional[str] = None   # Word forms: p:pl, d:done, etc.
     
     options: Optional[str] = None  # JSON string of distractor options
+    
+    # Sync clock value of the last insert/update (set by triggers, see services/sync.py)
+    change_version: int = Field(default=0, index=True, sa_column_kwargs={"server_default": "0"})
+
+
+class WordLevel(SQLModel, table=True):
+    """词库等级表 - One row per (word, level tag); Word.level keeps the joined string for display"""
+    __table_args__ = (
+        # Level-filtered lookups: all words of a level
+        Index("ix_wordlevel_level_word", "level", "word_id"),
+    )
+
+    word_id: int = Field(foreign_key="word.id", primary_key=True)
+    level: str = Field(primary_key=True)  # e.g. "CET4", "GRE", "AI"
 
 
 class UserProgress(SQLModel, table=True):
     """进度表 - User's learning progress for each word"""
+    __table_args__ = (
+        # One row per (user, word); target of the batch upsert
+        Index("ix_userprogress_user_word", "user_id", "word_id", unique=True),
+        # Due-review range scans when building sessions
+        Index("ix_userprogress_user_due", "user_id", "next_due"),
+        # Delta sync: a user's rows changed since a version
+        Index("ix_userprogress_user_version", "user_id", "change_version"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(index=True)  # User identifier
     word_id: int = Field(foreign_key="word.id", index=True)
     mastery_count: int = Field(default=0)  # 0, 1, 2, or 3
     last_reviewed: Optional[datetime] = None
+    next_due: Optional[datetime] = None  # Next spaced-repetition review, None once mastered
     is_mastered: bool = Field(default=False)  # True when mastery_count >= 3
+    last_seq: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # Last applied client seq
+    change_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})  # Sync clock, set by triggers
+
+
+class UserStats(SQLModel, table=True):
+    """统计表 - Per-user progress counters by level (see USER_STATS_ENABLED)"""
+    user_id: str = Field(primary_key=True)
+    level: str = Field(primary_key=True)  # Level tag, or "ALL" for the overall row
+    mastered: int = Field(default=0)
+    in_progress: int = Field(default=0)
 
 
 class AIStoryCache(SQLModel, table=True):
     """故事缓存表 - Cached AI-generated stories"""
     id: Optional[int] = Field(default=None, primary_key=True)
-    word_ids_hash: str = Field(index=True, unique=True)  # Hash of word IDs
+    word_ids_hash: str = Field(index=True, unique=True)  # Hash of word IDs + theme
     content: str  # The generated story
+    translation: Optional[str] = None  # Chinese translation of the story
     theme: Optional[str] = None  # Theme used (e.g., "量化投资")
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class PrefetchedSession(SQLModel, table=True):
+    """预取会话表 - Sessions built ahead of time and spilled from memory (see SESSION_PREFETCH_SPILL)"""
+    __table_args__ = (
+        # Oldest spilled session for a (user, level, count) queue
+        Index("ix_prefetchedsession_key", "user_id", "level", "count", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str
+    level: str
+    count: int
+    payload: str  # JSON list of WordResponse objects
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # --- Pydantic Schemas for API ---
 
 class WordResponse(SQLModel):
@@ -72,12 +123,49 @@ class WordResponse(SQLModel):
     options: list[str] = []  # Parsed from JSON
 
 
+class WordDetailsResponse(SQLModel):
+    """API response with a word's full dictionary data"""
+    id: int
+    text: str
+    definition: str
+    phonetic: Optional[str] = None
+    phonetic_us: Optional[str] = None
+    phonetic_uk: Optional[str] = None
+    definition_json: Optional[list] = None
+    exam_meta: Optional[list] = None
+    levels: list[str] = []
+    collins: int = 0
+    oxford: int = 0
+    exchange: Optional[str] = None
+
+
+class WordSearchResult(SQLModel):
+    """One hit of /api/words/search"""
+    id: int
+    text: str
+    definition: str
+    phonetic: Optional[str] = None
+    collins: int = 0
+    oxford: int = 0
+    match: str  # exact | prefix | text | definition | fuzzy
+
 
 class ProgressUpdate(SQLModel):
     """Request body for updating progress"""
     user_id: str
     word_id: int
     correct: bool
+    seq: Optional[int] = None  # Client sequence number, makes retries idempotent
+
+
+class ProgressBatchItem(ProgressUpdate):
+    """One answer inside a batch (sequence number required)"""
+    seq: int
+
+
+class ProgressBatch(SQLModel):
+    """Request body for applying many answers at once"""
+    updates: list[ProgressBatchItem]
 
 
 class ProgressResponse(SQLModel):
@@ -101,3 +189,15 @@ class StoryResponse(SQLModel):
     word_definitions: dict[str, str] = {}  # word -> Chinese definition
     theme: str
 
+
+class TranslateBatchRequest(SQLModel):
+    """Request body for translating many words at once"""
+    words: list[str]
+
+
+class TranslationResult(SQLModel):
+    """One word of /api/translate/batch"""
+    query: str  # The normalized word that was looked up
+    word: str  # Headword it resolved to (differs for inflected forms)
+    definition: Optional[str] = None  # None unless source is database or ai
+    source: str  # database | ai | not_found | error
@@ -0,0 +1,91 @@
+"""
+Voca 语刻 - Response Classes
+Opt-in orjson rendering for API responses (FAST_JSON_ENABLED), and response
+compression that leaves event streams alone
+"""
+
+import inspect
+import logging
+import os
+from contextvars import ContextVar
+
+from fastapi import routing
+from fastapi.datastructures import Default
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional dependency: pip install orjson
+    orjson = None
+
+FAST_JSON_ENABLED = os.getenv("FAST_JSON_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Recent FastAPI versions serialize response_model routes straight to bytes with
+# Pydantic, which beats orjson (see scripts/bench_serialization.py)
+FASTAPI_DUMPS_JSON = "dump_json" in inspect.signature(routing.serialize_response).parameters
+
+# The client-facing send of the current request, for responses that skip gzip
+_uncompressed_send: ContextVar = ContextVar("uncompressed_send", default=None)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson (UTF-8 output, like ensure_ascii=False)"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def default_response_class():
+    """
+    Response class for routers: FastJSONResponse when enabled, orjson is
+    installed and FastAPI has no native fast path; otherwise FastAPI's default
+
+    The default is returned as a Default() placeholder, since an explicit
+    response class turns FastAPI's fast path off.
+    """
+    if not FAST_JSON_ENABLED or FASTAPI_DUMPS_JSON:
+        return Default(JSONResponse)
+    if orjson is None:
+        logger.warning("FAST_JSON_ENABLED is set but orjson is not installed")
+        return Default(JSONResponse)
+    return FastJSONResponse
+
+
+class StreamSafeGZipMiddleware:
+    """
+    GZipMiddleware that never compresses text/event-stream responses.
+
+    Only recent Starlette versions exclude SSE from compression; older ones
+    buffer the stream in the compressor, so story chunks arrive late or all
+    at once. Event streams are sent past the compressor here instead.
+    """
+
+    def __init__(self, app, **options):
+        self.app = app
+        self.gzip = GZipMiddleware(self._send_streams_uncompressed, **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _uncompressed_send.set(send)
+        try:
+            await self.gzip(scope, receive, send)
+        finally:
+            _uncompressed_send.reset(token)
+
+    async def _send_streams_uncompressed(self, scope, receive, send):
+        raw_send = _uncompressed_send.get()
+        stream = False
+
+        async def send_wrapper(message):
+            nonlocal stream
+            if message["type"] == "http.response.start":
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                stream = content_type.startswith("text/event-stream")
+            await (raw_send if stream else send)(message)
+
+        await self.app(scope, receive, send_wrapper)
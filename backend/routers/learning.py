@@ -3,94 +3,140 @@ Voca 语刻 - Learning Router
 API endpoints for vocabulary learning sessions
 """
 
-import random
+import json
+import logging
 from datetime import datetime
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, func, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from database import get_db
+from database import async_session_maker, get_db, get_read_db, upsert
 from models import (
-    Word, UserProgress, AIStoryCache,
-    WordResponse, ProgressUpdate, ProgressResponse,
-    StoryRequest, StoryResponse
+    Word, WordLevel, UserProgress, AIStoryCache,
+    WordResponse, ProgressUpdate, ProgressBatch, ProgressResponse,
+    StoryRequest, StoryResponse, TranslateBatchRequest, TranslationResult
 )
-from services.ai_service import generate_story, generate_word_hash
+from responses import default_response_class
+from services.ai_service import (
+    generate_story, generate_word_hash, stream_story_with_translation
+)
+from services import progress_stats, scheduler
+from services.lemma_index import lemma_index
+from services.llm_client import llm
+from services.progress_buffer import PROGRESS_BUFFER_ENABLED, progress_buffer
+from services.session_prefetch import SESSION_PREFETCH_ENABLED, session_prefetch
+from services.sessions import SESSION_STRATEGY, build_session, parse_fields, parse_strategy, project_fields
+from services.story_cache import story_cache
+from services.story_prefetch import STORY_PREFETCH_ENABLED, story_prefetch
+from services.translation import TRANSLATE_BATCH_MAX, negative_cache, translate_batch
+from services.word_catalog import ALL_LEVELS, word_catalog
 
-router = APIRouter(prefix="/api", tags=["learning"])
+router = APIRouter(prefix="/api", tags=["learning"], default_response_class=default_response_class())
+logger = logging.getLogger(__name__)
 
 
-@router.get("/session", response_model=list[WordResponse])
+@router.get("/session", response_model=list[WordResponse], response_model_exclude_unset=True)
 async def get_learning_session(
     user_id: str,
     level: str = "ALL",
     count: int = 10,
-    db: Session = Depends(get_db)
+    compact: bool = False,
+    fields: Optional[str] = None,
+    theme: Optional[str] = StoryRequest.model_fields["theme"].default,
+    strategy: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     获取学习会话 - Get a learning session with words to study
     
-    Returns `count` random words where the user's mastery_count < 3
+    Returns `count` words: reviews that are due for the user, topped up with
+    words the user has not seen yet. `compact=true` or `fields=a,b` limit
+    each card to the listed fields; rich data is at /api/words/{id}/details.
+    `strategy=weighted` draws new words in proportion to how common they are.
+    With story prefetch on, the story for these words and `theme` starts
+    generating in the background
     """
-    # Get all words containing the specified level (e.g. "CET4" in "CET4,GRE")
-    if level == "ALL":
-        words_stmt = select(Word)
+    try:
+        selected_fields = parse_fields(fields, compact)
+        strategy = parse_strategy(strategy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not SESSION_PREFETCH_ENABLED or strategy != SESSION_STRATEGY:
+        # Prefetched sessions are built with the default strategy
+        result = await build_session(db, user_id, level, count, selected_fields, strategy=strategy)
     else:
-        words_stmt = select(Word).where(Word.level.like(f"%{level}%"))
-    all_words = db.exec(words_stmt).all()
+        # Served from the user's prefetch queue; built inline when it is empty
+        result = await session_prefetch.take(user_id, level, count)
+        if result is None:
+            result = await build_session(db, user_id, level, count)
+        if result:
+            session_prefetch.served(user_id, level, count, result)
+        result = project_fields(result, selected_fields)
     
-    print(f"[Session API] Total words in DB: {len(all_words)}")
+    logger.debug("Session served", extra={"level": level, "available": word_catalog.size(level)})
     
-    if not all_words:
+    if not result:
         raise HTTPException(status_code=404, detail=f"No words found")
     
-    # For testing: ignore mastery status, always return fresh words
-    # Select random words
-    selected = random.sample(all_words, min(count, len(all_words)))
-    
-    print(f"[Session API] Selected {len(selected)} words: {[w.text for w in selected]}")
-    
-    # Build response with options
-    result = []
-    for word in selected:
-        # Get 3 random distractor definitions
-        other_words = [w for w in all_words if w.id != word.id]
-        distractors = random.sample(other_words, min(3, len(other_words)))
-        
-        options = [word.definition] + [d.definition for d in distractors]
-        random.shuffle(options)
-        
-        result.append(WordResponse(
-            id=word.id,
-            text=word.text,
-            definition=word.definition,
-            phonetic=word.phonetic,
-            phonetic_us=word.phonetic_us,
-            phonetic_uk=word.phonetic_uk,
-            definition_json=word.definition_json,
-            exam_meta=word.exam_meta,
-            options=options
-        ))
+    if STORY_PREFETCH_ENABLED:
+        story_prefetch.schedule(
+            user_id, [{"id": w.id, "text": w.text, "definition": w.definition} for w in result], theme
+        )
     
     return result
 
 
+@router.get("/session/prefetch")
+async def get_session_prefetch_stats():
+    """会话预取统计 - Hit/miss counters of the session prefetch queues"""
+    return session_prefetch.stats()
+
+
+@router.get("/story/prefetch")
+async def get_story_prefetch_stats():
+    """故事预生成统计 - Counters of the background story generation"""
+    return story_prefetch.stats()
+
+
+@router.delete("/story/prefetch/{user_id}")
+async def cancel_story_prefetch(user_id: str):
+    """取消故事预生成 - Drop the user's pending story (e.g. they left the session)"""
+    story_prefetch.cancel(user_id)
+    return {"status": "cancelled"}
+
+
 @router.post("/progress", response_model=ProgressResponse)
 async def update_progress(
     update: ProgressUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     更新进度 - Update learning progress for a word
     
     Increments mastery_count if correct, marks as mastered at 3
     """
+    if PROGRESS_BUFFER_ENABLED:
+        # Applied in memory and journaled; written by the next flush
+        state = (await progress_buffer.apply(db, [update]))[(update.user_id, update.word_id)]
+        if SESSION_PREFETCH_ENABLED:
+            session_prefetch.refill_user(update.user_id)
+        return ProgressResponse(
+            word_id=update.word_id,
+            mastery_count=state.mastery_count,
+            is_mastered=state.is_mastered
+        )
+    
     # Find or create progress record
     stmt = select(UserProgress).where(
         UserProgress.user_id == update.user_id,
         UserProgress.word_id == update.word_id
     )
-    progress = db.exec(stmt).first()
+    progress = (await db.exec(stmt)).first()
     
     if not progress:
         progress = UserProgress(
@@ -99,6 +145,18 @@ async def update_progress(
             mastery_count=0
         )
         db.add(progress)
+    elif update.seq is not None and update.seq <= progress.last_seq:
+        # Retry of an answer that was already applied
+        return ProgressResponse(
+            word_id=progress.word_id,
+            mastery_count=progress.mastery_count,
+            is_mastered=progress.is_mastered
+        )
+    
+    if update.seq is not None:
+        progress.last_seq = update.seq
+    
+    previous_mastery = progress.mastery_count
     
     # Update if correct
     if update.correct:
@@ -107,8 +165,18 @@ async def update_progress(
             progress.is_mastered = True
     
     progress.last_reviewed = datetime.utcnow()
-    db.commit()
-    db.refresh(progress)
+    progress.next_due = scheduler.next_due(
+        progress.mastery_count, update.correct, progress.last_reviewed
+    )
+    
+    await word_catalog.ensure_loaded(db)
+    await progress_stats.record_changes(
+        db, update.user_id, [(update.word_id, previous_mastery, progress.mastery_count)]
+    )
+    await db.commit()
+    if SESSION_PREFETCH_ENABLED:
+        session_prefetch.refill_user(update.user_id)
+    await db.refresh(progress)
     
     return ProgressResponse(
         word_id=progress.word_id,
@@ -117,24 +185,125 @@ async def update_progress(
     )
 
 
+@router.post("/progress/batch", response_model=list[ProgressResponse])
+async def update_progress_batch(
+    batch: ProgressBatch,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量更新进度 - Apply a whole session of answers in one write
+    
+    Answers whose `seq` is not newer than the stored one are skipped, so a
+    retried batch is only applied once. Returns the state of every word.
+    """
+    if not batch.updates:
+        return []
+    
+    if PROGRESS_BUFFER_ENABLED:
+        states = await progress_buffer.apply(db, sorted(batch.updates, key=lambda u: u.seq))
+        if SESSION_PREFETCH_ENABLED:
+            for user_id in {user_id for user_id, _ in states}:
+                session_prefetch.refill_user(user_id)
+        return [
+            ProgressResponse(word_id=word_id, mastery_count=state.mastery_count, is_mastered=state.is_mastered)
+            for (user_id, word_id), state in states.items()
+        ]
+    
+    keys = {(u.user_id, u.word_id) for u in batch.updates}
+    stmt = select(UserProgress).where(
+        tuple_(UserProgress.user_id, UserProgress.word_id).in_(keys)
+    )
+    existing = {(p.user_id, p.word_id): p for p in (await db.exec(stmt)).all()}
+    
+    # Fold the new answers into one row per (user, word)
+    pending = {}
+    for update in sorted(batch.updates, key=lambda u: u.seq):
+        key = (update.user_id, update.word_id)
+        stored_seq = existing[key].last_seq if key in existing else 0
+        if update.seq <= stored_seq:
+            continue
+        row = pending.setdefault(key, {"correct": 0, "seq": stored_seq})
+        row["correct"] += int(update.correct)
+        row["seq"] = update.seq
+        row["last_correct"] = update.correct
+    
+    # Words never answered start at 0; they stay there if every answer was skipped
+    states = {key: (0, False) for key in keys}
+    states.update((key, (p.mastery_count, p.is_mastered)) for key, p in existing.items())
+    if pending:
+        now = datetime.utcnow()
+        table = UserProgress.__table__
+        insert = upsert(table).values([
+            {
+                "user_id": user_id,
+                "word_id": word_id,
+                "mastery_count": min(row["correct"], 3),
+                "is_mastered": row["correct"] >= 3,
+                "last_reviewed": now,
+                "next_due": scheduler.next_due(
+                    states.get((user_id, word_id), (0, False))[0] + row["correct"],
+                    row["last_correct"],
+                    now
+                ),
+                "last_seq": row["seq"],
+            }
+            for (user_id, word_id), row in pending.items()
+        ])
+        mastery = table.c.mastery_count + insert.excluded.mastery_count
+        capped = case((mastery > 3, 3), else_=mastery)
+        insert = insert.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.word_id],
+            set_={
+                "mastery_count": capped,
+                "is_mastered": capped >= 3,
+                "last_reviewed": insert.excluded.last_reviewed,
+                "next_due": insert.excluded.next_due,
+                "last_seq": insert.excluded.last_seq,
+            },
+            # Guards against a concurrent retry of the same batch
+            where=table.c.last_seq < insert.excluded.last_seq
+        ).returning(
+            table.c.user_id, table.c.word_id, table.c.mastery_count, table.c.is_mastered
+        )
+        changes = {}
+        for user_id, word_id, mastery_count, is_mastered in (await db.execute(insert)).all():
+            previous = states.get((user_id, word_id), (0, False))[0]
+            changes.setdefault(user_id, []).append((word_id, previous, mastery_count))
+            states[(user_id, word_id)] = (mastery_count, is_mastered)
+        
+        await word_catalog.ensure_loaded(db)
+        for user_id, user_changes in changes.items():
+            await progress_stats.record_changes(db, user_id, user_changes)
+        await db.commit()
+        if SESSION_PREFETCH_ENABLED:
+            for user_id in changes:
+                session_prefetch.refill_user(user_id)
+    
+    logger.debug("Progress batch applied", extra={"answers": len(batch.updates), "rows": len(pending)})
+    
+    return [
+        ProgressResponse(word_id=word_id, mastery_count=state[0], is_mastered=state[1])
+        for (user_id, word_id), state in states.items()
+    ]
+
+
 @router.post("/story", response_model=StoryResponse)
 async def generate_ai_story(
     request: StoryRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     生成AI故事 - Generate an AI-powered story using the given words
     
     Uses OpenAI-compatible API to generate contextual stories with translation
     """
-    print(f"[Story API] Received word_ids: {request.word_ids}")
-    print(f"[Story API] Theme: {request.theme}")
-    
     # Fetch words from database
     words_stmt = select(Word).where(Word.id.in_(request.word_ids))
-    words = db.exec(words_stmt).all()
+    words = (await db.exec(words_stmt)).all()
     
-    print(f"[Story API] Found {len(words)} words in DB: {[w.text for w in words]}")
+    logger.debug("Story requested", extra={
+        "word_ids": request.word_ids, "found": len(words), "theme": request.theme
+    })
     
     if not words:
         raise HTTPException(status_code=404, detail="No words found for the given IDs")
@@ -145,16 +314,26 @@ async def generate_ai_story(
     # Build word definitions dict for frontend
     word_definitions = {w.text: w.definition for w in words}
     
-    print(f"[Story API] Sending to AI: {len(word_data)} words")
-    
-    # Import the new function
-    from services.ai_service import generate_story_with_translation
-    
-    # Generate story + translation
-    result = await generate_story_with_translation(word_data, request.theme)
+    cache_key = generate_word_hash([w.id for w in words], request.theme)
+    result = await story_cache.get(db, cache_key)
+    if result is None:
+        # Join the background job if it is already writing this story
+        result = await story_prefetch.claim(cache_key)
     
-    print(f"[Story API] Generated story length: {len(result['content'])}")
-    print(f"[Story API] Translation length: {len(result['translation'])}")
+    if result is not None:
+        logger.debug("Story cache hit", extra={"cache_key": cache_key})
+    else:
+        
+        # Import the new function
+        from services.ai_service import generate_story_with_translation
+        
+        # Generate story + translation
+        result = await generate_story_with_translation(word_data, request.theme)
+        
+        if not result.get("fallback"):
+            # Take the writer only for the insert, not while the model runs
+            async with async_session_maker() as cache_db:
+                await story_cache.put(cache_db, cache_key, request.theme, result)
     
     return StoryResponse(
         content=result["content"],
@@ -165,79 +344,188 @@ async def generate_ai_story(
     )
 
 
+@router.post("/story/stream")
+async def stream_ai_story(
+    request: StoryRequest,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    流式生成AI故事 - Stream a story over Server-Sent Events
+    
+    Emits `english` and `chinese` events carrying text deltas as the model
+    writes them, then `done` with the full StoryResponse. Cached stories are
+    replayed at once; an `error` event ends the stream if the model fails.
+    """
+    words = (await db.exec(select(Word).where(Word.id.in_(request.word_ids)))).all()
+    if not words:
+        raise HTTPException(status_code=404, detail="No words found for the given IDs")
+    
+    word_data = [{"text": w.text, "definition": w.definition} for w in words]
+    cache_key = generate_word_hash([w.id for w in words], request.theme)
+    cached = await story_cache.get(db, cache_key)
+    if cached is None:
+        cached = await story_prefetch.claim(cache_key)
+    
+    def sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def done(story: dict) -> str:
+        return sse("done", StoryResponse(
+            content=story["content"],
+            translation=story["translation"],
+            keywords=[w.text for w in words],
+            word_definitions={w.text: w.definition for w in words},
+            theme=request.theme
+        ).model_dump())
+    
+    async def events():
+        if cached is not None:
+            yield sse("english", {"text": cached["content"]})
+            yield sse("chinese", {"text": cached["translation"]})
+            yield done(cached)
+            return
+        
+        story = None
+        try:
+            async for section, payload in stream_story_with_translation(word_data, request.theme):
+                if section == "done":
+                    story = payload
+                else:
+                    yield sse(section, {"text": payload})
+        except Exception as e:
+            logger.warning("Story stream failed: %s", e)
+            yield sse("error", {"detail": str(e)})
+            return
+        
+        # A reply that never reached the markers parses to nothing; don't pin it
+        if story["content"] and story["translation"]:
+            # The request's session is gone once streaming starts
+            async with async_session_maker() as cache_db:
+                await story_cache.put(cache_db, cache_key, request.theme, story)
+        yield done(story)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/story/cache")
+async def get_story_cache_stats():
+    """故事缓存统计 - Hit/miss counters of the story cache"""
+    return story_cache.stats()
+
+
+@router.get("/progress/buffer/stats")
+async def get_progress_buffer_stats():
+    """进度写缓冲统计 - Counters of the write-behind progress buffer"""
+    return progress_buffer.stats()
+
+
 @router.get("/progress/{user_id}")
 async def get_user_progress(
     user_id: str,
-    db: Session = Depends(get_db)
+    # Only the userstats path writes (a user's first read builds the counters)
+    db: AsyncSession = Depends(get_db if progress_stats.USER_STATS_ENABLED else get_read_db)
 ):
-    """获取用户进度统计 - Get user's overall learning progress"""
-    # Total words
-    total_stmt = select(Word)
-    total_words = len(db.exec(total_stmt).all())
-    
-    # Mastered words
-    mastered_stmt = select(UserProgress).where(
-        UserProgress.user_id == user_id,
-        UserProgress.is_mastered == True
-    )
-    mastered_count = len(db.exec(mastered_stmt).all())
+    """获取用户进度统计 - Get user's overall learning progress, with a per-level breakdown"""
+    total_words = (await db.exec(select(func.count()).select_from(Word))).one()
     
-    # In progress (1-2 mastery)
-    progress_stmt = select(UserProgress).where(
-        UserProgress.user_id == user_id,
-        UserProgress.is_mastered == False,
-        UserProgress.mastery_count > 0
-    )
-    in_progress = len(db.exec(progress_stmt).all())
+    await word_catalog.ensure_loaded(db)
+    counts = await progress_stats.load_counts(db, user_id)
+    if PROGRESS_BUFFER_ENABLED:
+        counts = progress_stats.apply_changes(counts, progress_buffer.pending_changes(user_id))
+    
+    overall = counts[ALL_LEVELS]
+    levels = {}
+    for level in word_catalog.levels():
+        level_total = word_catalog.size(level)
+        level_counts = counts[level]
+        levels[level] = {
+            "total_words": level_total,
+            "mastered": level_counts["mastered"],
+            "in_progress": level_counts["in_progress"],
+            "new": level_total - level_counts["mastered"] - level_counts["in_progress"]
+        }
     
     return {
         "total_words": total_words,
-        "mastered": mastered_count,
-        "in_progress": in_progress,
-        "new": total_words - mastered_count - in_progress
+        "mastered": overall["mastered"],
+        "in_progress": overall["in_progress"],
+        "new": total_words - overall["mastered"] - overall["in_progress"],
+        "levels": levels
     }
 
 
+@router.post("/translate/batch", response_model=list[TranslationResult])
+async def translate_words(
+    request: TranslateBatchRequest,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    批量翻译单词 - Translate many words in one request
+    
+    Known words and inflected forms are resolved with one query; the rest
+    go to the model in a single request and are stored together. Words the
+    model rejected or failed on are answered from a negative cache for a
+    while instead of being retried.
+    """
+    if len(request.words) > TRANSLATE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {TRANSLATE_BATCH_MAX} words per request")
+    return await translate_batch(db, request.words)
+
+
 @router.get("/translate/{word}")
 async def translate_word(
     word: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     翻译单词 - Translate a single word
     
-    First checks database, if not found uses AI to translate and adds to DB
+    First checks database (exact match, then the headword of an inflected
+    form), if not found uses AI to translate and adds to DB
     """
     # Normalize the word
     word_lower = word.lower().strip()
-    print(f"[Translate API] Looking up: {word_lower}")
     
     # Check if word exists in database
     stmt = select(Word).where(Word.text == word_lower)
-    existing = db.exec(stmt).first()
+    existing = (await db.exec(stmt)).first()
+    
+    if not existing:
+        # Inflected forms ("derivatives") resolve to their headword locally
+        await lemma_index.ensure_loaded(db)
+        candidates = lemma_index.candidates(word_lower)
+        if candidates:
+            rows = (await db.exec(select(Word).where(Word.text.in_(candidates)))).all()
+            by_text = {w.text: w for w in rows}
+            existing = next((by_text[c] for c in candidates if c in by_text), None)
     
     if existing:
-        print(f"[Translate API] Found in DB: {existing.definition}")
         return {
             "word": existing.text,
             "definition": existing.definition,
-            "source": "database"
+            "source": "database",
+            "query": word_lower
+        }
+    
+    failure = negative_cache.get(word_lower)
+    if failure is not None:
+        source, detail = failure
+        return {
+            "word": word_lower,
+            "definition": f"翻译失败: {detail}",
+            "source": source,
+            "query": word_lower
         }
     
     # Not in DB - use AI to translate
-    print(f"[Translate API] Not in DB, calling AI...")
+    logger.debug("Translate miss, asking the model", extra={"word": word_lower})
     
     try:
-        from openai import OpenAI
-        import os
-        
-        client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-        )
-        
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "deepseek-chat"),
+        response = await llm.chat(
             messages=[
                 {"role": "system", "content": "你是一个简洁的英语词典。只输出中文释义，不要任何其他内容。"},
                 {"role": "user", "content": f"请用简短的中文解释这个英语单词的意思：{word_lower}"}
@@ -247,30 +535,38 @@ async def translate_word(
         )
         
         definition = response.choices[0].message.content.strip()
-        print(f"[Translate API] AI translated: {definition}")
-        
         # Add to database
         new_word = Word(
             text=word_lower,
             definition=definition,
             level="AI"  # Mark as AI-generated
         )
-        db.add(new_word)
-        db.commit()
-        db.refresh(new_word)
-        
-        print(f"[Translate API] Added to DB with id: {new_word.id}")
+        async with async_session_maker() as write_db:
+            write_db.add(new_word)
+            try:
+                await write_db.flush()
+                write_db.add(WordLevel(word_id=new_word.id, level="AI"))
+                await write_db.commit()
+            except IntegrityError:
+                # A concurrent request for the same word stored it first
+                await write_db.rollback()
+            else:
+                word_catalog.invalidate()
+                logger.info("Added AI translation", extra={"word": word_lower, "word_id": new_word.id})
         
         return {
             "word": word_lower,
             "definition": definition,
-            "source": "ai"
+            "source": "ai",
+            "query": word_lower
         }
         
     except Exception as e:
-        print(f"[Translate API] Error: {e}")
+        logger.warning("Translate failed for %r: %s", word_lower, e)
+        negative_cache.put(word_lower, "error", str(e))
         return {
             "word": word_lower,
             "definition": f"翻译失败: {str(e)}",
-            "source": "error"
+            "source": "error",
+            "query": word_lower
         }
@@ -0,0 +1,37 @@
+"""
+Voca 语刻 - Sync Router
+Delta sync for clients that keep a local copy of the catalog and progress
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_read_db
+from services.sync import SYNC_PAGE_SIZE, changes_since, ndjson
+
+router = APIRouter(prefix="/api", tags=["sync"])
+
+
+@router.get("/sync")
+async def sync(
+    since: int = Query(0, ge=0),
+    user_id: Optional[str] = None,
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    增量同步 - Words (and the user's progress) changed since a version, as NDJSON
+    
+    One object per line in version order, then {"t": "end", "version", "more"}:
+    pass `version` as `since` next time, immediately again while `more` is true
+    """
+    # Read before streaming: the session is closed once the response starts
+    lines, version, more = await changes_since(db, since, user_id, limit)
+    return StreamingResponse(
+        ndjson(lines, version, more),
+        media_type="application/x-ndjson",
+        headers={"X-Sync-Version": str(version), "Cache-Control": "no-cache"}
+    )
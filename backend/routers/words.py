@@ -0,0 +1,64 @@
+"""
+Voca 语刻 - Words Router
+Dictionary data for single words, fetched on demand by the client
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import get_read_db
+from models import Word, WordLevel, WordDetailsResponse, WordSearchResult
+from responses import default_response_class
+from services.word_search import search_words
+
+router = APIRouter(prefix="/api/words", tags=["words"], default_response_class=default_response_class())
+
+
+@router.get("/search", response_model=list[WordSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    搜索单词 - Prefix, substring and fuzzy search over words and Chinese definitions
+    
+    Exact and prefix matches come first, then substring and misspelling
+    matches; ties go to the higher Collins/Oxford rating
+    """
+    return await search_words(db, q, limit)
+
+
+@router.get("/{word_id}/details", response_model=WordDetailsResponse)
+async def get_word_details(
+    word_id: int,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    单词详情 - Full dictionary entry for one word
+    
+    The heavy fields (definition_json, exam_meta) that compact sessions leave out
+    """
+    word = await db.get(Word, word_id)
+    if word is None:
+        raise HTTPException(status_code=404, detail="Word not found")
+    
+    levels = (await db.exec(
+        select(WordLevel.level).where(WordLevel.word_id == word_id)
+    )).all()
+    
+    return WordDetailsResponse(
+        id=word.id,
+        text=word.text,
+        definition=word.definition,
+        phonetic=word.phonetic,
+        phonetic_us=word.phonetic_us,
+        phonetic_uk=word.phonetic_uk,
+        definition_json=word.definition_json,
+        exam_meta=word.exam_meta,
+        levels=list(levels),
+        collins=word.collins or 0,
+        oxford=word.oxford or 0,
+        exchange=word.exchange
+    )
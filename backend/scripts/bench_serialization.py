@@ -0,0 +1,116 @@
+"""
+Benchmark serializing a learning session response.
+Compares FastAPI's encoders with orjson for a session of synthetic words,
+in full and compact form, and the cost and savings of gzip on the result.
+
+    python scripts/bench_serialization.py
+    python scripts/bench_serialization.py --words 50 --rounds 2000
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+# Add backend directory to path to import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import WordResponse
+from responses import FastJSONResponse, orjson
+from services.sessions import COMPACT_FIELDS, REQUIRED_FIELDS
+
+SESSION_ADAPTER = TypeAdapter(list[WordResponse])
+
+
+def synthetic_word(i):
+    """A word about as heavy as an ECDICT entry with exam sentences"""
+    return WordResponse(
+        id=i,
+        text=f"word{i}",
+        definition=f"n. 释义{i}；含义\nv. 动作{i}",
+        phonetic="/ˈwɜːrd/",
+        phonetic_us="/ˈwɝːd/",
+        phonetic_uk="/ˈwɜːd/",
+        definition_json=[
+            {"pos": pos, "meaning": f"{pos} 释义 {i} 的较长中文解释", "tags": "CET4,CET6,GRE"}
+            for pos in ("n.", "v.", "adj.")
+        ],
+        exam_meta=[
+            {
+                "exam": exam,
+                "year": 2015 + k,
+                "sentence": f"An example sentence using word{i} in context number {k}.",
+                "translation": f"第 {k} 个包含 word{i} 的例句翻译。"
+            }
+            for k, exam in enumerate(("CET4", "CET6", "Kaoyan"))
+        ],
+        options=[f"选项 {i}-{k}" for k in range(4)]
+    )
+
+
+def compact_word(word):
+    fields = REQUIRED_FIELDS + COMPACT_FIELDS
+    return WordResponse(**{name: getattr(word, name) for name in fields})
+
+
+def per_call_us(fn, rounds):
+    fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def run(words, rounds, gzip_level):
+    full = [synthetic_word(i) for i in range(words)]
+    compact = [compact_word(w) for w in full]
+
+    results = {}
+    for name, session in (("full", full), ("compact", compact)):
+        exclude_unset = name == "compact"
+        cases = {
+            # Older FastAPI: jsonable_encoder, then json.dumps in JSONResponse
+            "jsonable_encoder+json": lambda: JSONResponse(
+                jsonable_encoder(session, exclude_unset=exclude_unset)
+            ).body,
+            # Recent FastAPI with a response_model: Pydantic straight to bytes
+            "pydantic_dump_json": lambda: SESSION_ADAPTER.dump_json(
+                session, exclude_unset=exclude_unset
+            ),
+        }
+        if orjson is not None:
+            # FAST_JSON_ENABLED: Pydantic to Python, then orjson
+            cases["dump_python+orjson"] = lambda: FastJSONResponse(
+                SESSION_ADAPTER.dump_python(session, mode="json", exclude_unset=exclude_unset)
+            ).body
+
+        body = cases["pydantic_dump_json"]()
+        compressed = gzip.compress(body, compresslevel=gzip_level)
+        results[name] = {
+            "bytes": len(body),
+            "gzip_bytes": len(compressed),
+            "gzip_us": round(per_call_us(lambda: gzip.compress(body, compresslevel=gzip_level), rounds), 1),
+            "serialize_us": {
+                case: round(per_call_us(fn, rounds), 1) for case, fn in cases.items()
+            }
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    args = parser.parse_args()
+
+    results = run(args.words, args.rounds, args.gzip_level)
+    print(json.dumps({"words": args.words, "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Script to precompute distractor pools into Word.options.
+Each word gets DISTRACTOR_POOL_SIZE definitions taken from words of the same
+level and part of speech, so sessions never have to scan the catalog.
+"""
+import os
+import sys
+import argparse
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+# Add backend directory to path to import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import Word
+from database import engine
+from services.distractors import (
+    DISTRACTOR_POOL_SIZE, distractor_candidates, dump_pool, part_of_speech
+)
+from services.word_catalog import ALL_LEVELS, word_catalog
+
+BATCH_SIZE = 1000
+
+
+def build_pools(missing_only=False, pool_size=DISTRACTOR_POOL_SIZE):
+    with Session(engine) as session:
+        word_catalog.load(session)
+        definitions = dict(session.exec(select(Word.id, Word.definition)).all())
+        print(f"Building distractor pools for {len(definitions)} words...")
+
+        stmt = select(Word.id, Word.definition_json, Word.definition, Word.options)
+        if missing_only:
+            stmt = stmt.where(Word.options == None)
+
+        pending = []
+        built = 0
+        for word_id, definition_json, definition, options in session.exec(stmt).all():
+            levels = word_catalog.levels_of(word_id)
+            primary_level = levels[0] if levels else ALL_LEVELS
+            pos = part_of_speech(definition_json, definition)
+
+            # Oversample so duplicate definitions can be dropped
+            pool = []
+            for candidate_id in distractor_candidates(word_catalog, primary_level, pos, word_id, pool_size * 2):
+                candidate = definitions.get(candidate_id)
+                if candidate and candidate != definition and candidate not in pool:
+                    pool.append(candidate)
+                if len(pool) == pool_size:
+                    break
+
+            pending.append({"id": word_id, "options": dump_pool(pool)})
+            built += 1
+            if len(pending) >= BATCH_SIZE:
+                session.execute(update(Word), pending)
+                session.commit()
+                pending = []
+                print(f"Processed {built} words...")
+
+        if pending:
+            session.execute(update(Word), pending)
+            session.commit()
+
+    print(f"Finished distractor pools: {built} words updated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--missing-only", action="store_true", help="only fill words without a pool")
+    parser.add_argument("--pool-size", type=int, default=DISTRACTOR_POOL_SIZE)
+    args = parser.parse_args()
+    build_pools(missing_only=args.missing_only, pool_size=args.pool_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Script to export the word catalog snapshot.
+Writes the catalog (ids, texts, definitions, levels, parts of speech) for
+the current catalog version to CATALOG_SNAPSHOT_PATH, so API workers map the
+file at startup instead of loading every word. Run it after imports;
+workers also rebuild a stale snapshot themselves on first use.
+
+    CATALOG_SNAPSHOT_PATH=./catalog.snapshot python scripts/export_catalog.py
+    python scripts/export_catalog.py --output /var/lib/voca/catalog.snapshot
+"""
+import os
+import sys
+import time
+import argparse
+
+from sqlmodel import Session
+
+# Add backend directory to path to import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import engine
+from services.word_catalog import CATALOG_SNAPSHOT_PATH, WordCatalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=CATALOG_SNAPSHOT_PATH or "./catalog.snapshot",
+                        help="snapshot file (default: CATALOG_SNAPSHOT_PATH)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    catalog = WordCatalog(snapshot_path=args.output)
+    with Session(engine) as session:
+        catalog.load(session)
+
+    print(f"Exported {catalog.size()} words in {len(catalog.levels())} levels "
+          f"to {args.output} ({os.path.getsize(args.output) / 2**20:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+    if args.output != CATALOG_SNAPSHOT_PATH:
+        print("Set CATALOG_SNAPSHOT_PATH to this file for the API to use it")
+
+
+if __name__ == "__main__":
+    main()
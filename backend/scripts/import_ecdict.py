@@ -1,20 +1,35 @@
 """
 Script to download and import skywind3000/ECDICT data.
 ECDICT provides rich definitions, phonetics, and tags.
+
+The CSV is streamed from a URL or a local file, parsed in a process pool and
+written with chunked INSERT ... ON CONFLICT(text) DO UPDATE statements.
+Progress is checkpointed after every chunk, so --resume continues an import
+that failed halfway.
+
+    python scripts/import_ecdict.py
+    python scripts/import_ecdict.py --source ecdict.csv --workers 4
+    python scripts/import_ecdict.py --resume
 """
 import os
 import sys
 import csv
-import requests
-import io
-import zipfile
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
 from sqlmodel import Session, select
-from sqlalchemy import or_
 
 # Add backend directory to path to import models
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import Word
-from database import engine
+from database import create_db_and_tables, engine, upsert
+from services.progress_stats import reset_counts
+from services.word_catalog import word_catalog
+from services.word_levels import add_word_levels, merge_levels, split_levels
+from services.word_search import bulk_load
 
 # Using the mini version for faster download, but it still has 77k+ words
 # Full version is too large for GitHub direct download reliably without git lfs
@@ -31,145 +46,248 @@ TAG_MAP = {
     "ky": "Kaoyan"
 }
 
-def download_ecdict():
-    print(f"Downloading ECDICT (Mini) from {ECDICT_URL}...")
-    try:
-        response = requests.get(ECDICT_URL)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        print(f"Failed to download ECDICT: {e}")
+# Level of words kept only for their Collins/Oxford rating
+GENERAL_LEVEL = "General"
+
+CHUNK_LINES = 5000  # CSV lines handed to a parser process at a time
+WRITE_BATCH = 500   # Rows per INSERT statement
+CHECKPOINT_PATH = ".ecdict_import.ckpt"
+
+# Columns refreshed when the word already exists (definition is kept)
+UPDATE_COLUMNS = [
+    "phonetic", "phonetic_uk", "phonetic_us", "collins", "oxford",
+    "tag", "exchange", "definition_json", "level"
+]
+
+
+def iter_lines(source):
+    """Yield CSV lines from a URL or a local file without loading it whole"""
+    if source.startswith(("http://", "https://")):
+        print(f"Streaming ECDICT from {source}...")
+        with httpx.stream("GET", source, follow_redirects=True, timeout=60) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                yield line
+    else:
+        print(f"Reading ECDICT from {source}...")
+        with open(source, encoding="utf-8", newline="") as f:
+            for line in f:
+                yield line.rstrip("\r\n")
+
+
+def _to_int(value):
+    return int(value) if value and value.isdigit() else 0
+
+
+def parse_row(row):
+    """Turn one ECDICT row into Word column values, or None to skip it"""
+    word_text = row.get('word')
+    if not word_text:
         return None
 
-def parse_and_import(csv_content):
-    print("Parsing ECDICT CSV...")
-    
-    # Use csv module to handle quoting and commas correctly
-    f = io.StringIO(csv_content)
-    reader = csv.DictReader(f)
-    
+    # Filter non-English words if necessary (basic check)
+    if not word_text[0].isalpha():
+        return None
+
+    word_lower = word_text.lower().strip()
+
+    # Map tags to levels
+    raw_tags = row.get('tag') or ''
+    levels = []
+    for tag in raw_tags.split(' '):
+        if tag in TAG_MAP:
+            levels.append(TAG_MAP[tag])
+
+    # Keep if it has exam tags OR is Oxford/Collins
+    collins = row.get('collins', '0')
+    oxford = row.get('oxford', '0')
+    is_common = (collins and collins != '0') or (oxford and oxford != '0')
+    if not levels and not is_common:
+        return None
+
+    level_str = ",".join(levels) if levels else GENERAL_LEVEL
+
+    # Formatting definition
+    # ECDICT format: "n. definition\nv. definition" (newlines)
+    definition_raw = (row.get('translation') or '').replace('\\n', '\n')
+    if not definition_raw:
+        definition_raw = (row.get('definition') or '').replace('\\n', '\n')
+
+    # Construct definitions JSON
+    definitions_json = []
+    for line in definition_raw.split('\n'):
+        parts = line.split('. ', 1)
+        if len(parts) == 2:
+            pos = parts[0] + '.'
+            meaning = parts[1]
+        else:
+            pos = 'unk.'
+            meaning = line
+
+        definitions_json.append({
+            "pos": pos,
+            "meaning": meaning,
+            "tags": level_str
+        })
+
+    phonetic = row.get('phonetic')
+    return {
+        "text": word_lower,
+        "definition": definition_raw,  # Fallback string
+        "definition_json": definitions_json,
+        "phonetic": phonetic,
+        "phonetic_uk": row.get('bre') or phonetic,
+        "phonetic_us": row.get('ape') or phonetic,
+        "level": level_str,
+        "collins": _to_int(collins),
+        "oxford": _to_int(oxford),
+        "tag": raw_tags,
+        "exchange": row.get('exchange')
+    }
+
+
+def parse_chunk(fieldnames, lines):
+    """Parse a block of CSV lines (runs in a worker process)"""
+    records = []
+    for row in csv.DictReader(lines, fieldnames=fieldnames):
+        record = parse_row(row)
+        if record:
+            records.append(record)
+    return records
+
+
+def iter_chunks(lines, skip):
+    """Group data lines into (lines_consumed, chunk) blocks, after skipping `skip`"""
+    chunk = []
+    for index, line in enumerate(lines):
+        if index < skip:
+            continue
+        chunk.append(line)
+        if len(chunk) >= CHUNK_LINES:
+            yield len(chunk), chunk
+            chunk = []
+    if chunk:
+        yield len(chunk), chunk
+
+
+def iter_parsed(fieldnames, chunks, workers):
+    """Parse chunks in a process pool, in order, with bounded read-ahead"""
+    if workers <= 1:
+        for consumed, chunk in chunks:
+            yield consumed, parse_chunk(fieldnames, chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for consumed, chunk in chunks:
+            pending.append((consumed, pool.submit(parse_chunk, fieldnames, chunk)))
+            if len(pending) >= workers * 2:
+                done_consumed, future = pending.popleft()
+                yield done_consumed, future.result()
+        while pending:
+            done_consumed, future = pending.popleft()
+            yield done_consumed, future.result()
+
+
+def load_checkpoint(path, source):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return 0
+    if checkpoint.get("source") != source:
+        print(f"Checkpoint is for {checkpoint.get('source')}, starting over")
+        return 0
+    return checkpoint.get("lines", 0)
+
+
+def save_checkpoint(path, source, lines):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"source": source, "lines": lines}, f)
+    os.replace(tmp_path, path)
+
+
+def write_records(session, records, known_levels):
+    """Upsert parsed rows and their WordLevel tags"""
+    added = 0
+    for record in records:
+        existing = known_levels.get(record["text"])
+        if existing is None:
+            added += 1
+        else:
+            # Word.level is the display copy; wordlevel rows are merged below.
+            # Only exam tags are added: the catch-all is for new words
+            exams = [tag for tag in split_levels(record["level"]) if tag != GENERAL_LEVEL]
+            record["level"] = merge_levels(existing, *exams)
+        known_levels[record["text"]] = record["level"]
+
+    # A word may appear twice in one chunk; the last row wins
+    records = list({r["text"]: r for r in records}.values())
+    table = Word.__table__
+    for start in range(0, len(records), WRITE_BATCH):
+        insert = upsert(table).values(records[start:start + WRITE_BATCH])
+        insert = insert.on_conflict_do_update(
+            index_elements=["text"],
+            set_={column: insert.excluded[column] for column in UPDATE_COLUMNS}
+        ).returning(table.c.id, table.c.level)
+        level_rows = [
+            {"word_id": word_id, "level": tag}
+            for word_id, level in session.execute(insert).all()
+            for tag in split_levels(level)
+        ]
+        if level_rows:
+            session.execute(add_word_levels(level_rows))
+    return added
+
+
+def import_ecdict(source=ECDICT_URL, workers=None, resume=False, checkpoint_path=CHECKPOINT_PATH):
+    create_db_and_tables()
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    skip = load_checkpoint(checkpoint_path, source) if resume else 0
+    if skip:
+        print(f"Resuming after {skip} lines")
+
+    lines = iter_lines(source)
+    fieldnames = next(csv.reader([next(lines)]))
+
     count = 0
     added = 0
-    updated = 0
-    
-    with Session(engine) as session:
-        for row in reader:
-            word_text = row.get('word')
-            if not word_text:
-                continue
-                
-            # Filter non-English words if necessary (basic check)
-            if not word_text[0].isalpha():
-                continue
-
-            word_lower = word_text.lower().strip()
-            
-            # Map tags to levels
-            raw_tags = row.get('tag', '')
-            levels = []
-            for tag in raw_tags.split(' '):
-                if tag in TAG_MAP:
-                    levels.append(TAG_MAP[tag])
-            
-            # Keep if it has exam tags OR is Oxford/Collins OR has basic tags
-            collins = row.get('collins', '0')
-            oxford = row.get('oxford', '0')
-            is_common = (collins and collins != '0') or (oxford and oxford != '0')
-            
-            # Skip if no relevant levels and not a common word (collins/oxford)
-            # Debug why we are skipping
-            if count < 10: 
-                 print(f"Row: {word_lower}, Tags: {raw_tags}, Levels: {levels}, IsCommon: {is_common}")
-
-            if not levels and not is_common:
-                 continue
-            
-            level_str = ",".join(levels) if levels else "General"
-            
-            # Debug first few hits
-            if added == 0 and updated == 0:
-                print(f"Found first match: {word_lower} (Levels: {level_str})")
-            
-            # Formatting definition
-            # ECDICT format: "n. definition\nv. definition" (newlines)
-            definition_raw = row.get('translation', '').replace('\\n', '\n')
-            if not definition_raw:
-                definition_raw = row.get('definition', '').replace('\\n', '\n')
-            
-            # Construct definitions JSON
-            definitions_json = []
-            for line in definition_raw.split('\n'):
-                parts = line.split('. ', 1)
-                if len(parts) == 2:
-                    pos = parts[0] + '.'
-                    meaning = parts[1]
-                else:
-                    pos = 'unk.'
-                    meaning = line
-                
-                definitions_json.append({
-                    "pos": pos,
-                    "meaning": meaning,
-                    "tags": level_str
-                })
-
-            # Check if exists
-            stmt = select(Word).where(Word.text == word_lower)
-            existing = session.exec(stmt).first()
-            
-            # Safe casting
-            try:
-                collins_val = int(collins) if collins and collins.isdigit() else 0
-                oxford_val = int(oxford) if oxford and oxford.isdigit() else 0
-            except ValueError:
-                collins_val = 0
-                oxford_val = 0
-
-            if existing:
-                # Update with richer data
-                existing.phonetic = row.get('phonetic')
-                existing.phonetic_uk = row.get('bre') if row.get('bre') else row.get('phonetic')
-                existing.phonetic_us = row.get('ape') if row.get('ape') else row.get('phonetic')
-                existing.collins = collins_val
-                existing.oxford = oxford_val
-                existing.tag = raw_tags
-                existing.exchange = row.get('exchange')
-                existing.definition_json = definitions_json
-                
-                # Merge levels
-                existing_levels = existing.level.split(',') if existing.level else []
-                new_levels = set(existing_levels + levels)
-                existing.level = ",".join(new_levels)
-                
-                session.add(existing)
-                updated += 1
-            else:
-                new_word = Word(
-                    text=word_lower,
-                    definition=definition_raw,  # Fallback string
-                    definition_json=definitions_json,
-                    phonetic=row.get('phonetic'),
-                    phonetic_uk=row.get('bre') if row.get('bre') else row.get('phonetic'),
-                    phonetic_us=row.get('ape') if row.get('ape') else row.get('phonetic'),
-                    level=level_str,
-                    collins=collins_val,
-                    oxford=oxford_val,
-                    tag=raw_tags,
-                    exchange=row.get('exchange')
-                )
-                session.add(new_word)
-                added += 1
-            
-            count += 1
-            if count % 1000 == 0:
-                print(f"Processed {count} words...")
-                session.commit()
-                
+    consumed_total = skip
+    # Search index is rebuilt once at the end instead of per row
+    with bulk_load(engine), Session(engine) as session:
+        known_levels = dict(session.exec(select(Word.text, Word.level)).all())
+        print(f"Preloaded {len(known_levels)} existing words")
+
+        for consumed, records in iter_parsed(fieldnames, iter_chunks(lines, skip), workers):
+            added += write_records(session, records, known_levels)
+            session.commit()
+            count += len(records)
+            consumed_total += consumed
+            save_checkpoint(checkpoint_path, source, consumed_total)
+            print(f"Processed {count} words ({consumed_total} lines)...")
+
+        # Per-level progress counters are rebuilt on each user's next read
+        session.execute(reset_counts())
         session.commit()
-    
-    print(f"Finished ECDICT Import: Added {added}, Updated {updated}, Total Scan {count}")
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    # Let running API workers pick up the new words
+    word_catalog.invalidate()
+    print(f"Finished ECDICT Import: Added {added}, Updated {count - added}, Total Scan {consumed_total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=ECDICT_URL, help="CSV URL or local path")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    args = parser.parse_args()
+    import_ecdict(args.source, args.workers, args.resume, args.checkpoint)
+
 
 if __name__ == "__main__":
-    csv_content = download_ecdict()
-    if csv_content:
-        parse_and_import(csv_content)
+    main()
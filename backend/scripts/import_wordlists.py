@@ -11,6 +11,9 @@ from sqlmodel import Session, select, create_engine, SQLModel
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models import Word
 from database import engine
+from services.progress_stats import reset_counts
+from services.word_catalog import word_catalog
+from services.word_levels import add_level_by_text, merge_levels
 
 WORDLIST_URLS = {
     # Standard format: word [phonetic] definition
@@ -83,6 +86,7 @@ def import_wordlist(level, url, session):
     count = 0
     added = 0
     updated = 0
+    texts = []
     
     lines = content.split('\n')
     for line in lines:
@@ -98,12 +102,10 @@ def import_wordlist(level, url, session):
         stmt = select(Word).where(Word.text == word_lower)
         existing = session.exec(stmt).first()
         
+        texts.append(word_lower)
         if existing:
-            # Update level if not present
-            levels = existing.level.split(',') if existing.level else []
-            if level not in levels:
-                levels.append(level)
-                existing.level = ",".join(levels)
+            # Keep the display string in step with the wordlevel rows
+            existing.level = merge_levels(existing.level, level)
                 
             # Update phonetic if missing
             if not existing.phonetic and phonetic:
@@ -132,8 +134,14 @@ def import_wordlist(level, url, session):
         count += 1
         if count % 1000 == 0:
             print(f"Processed {count} words...")
+            session.flush()
+            session.execute(add_level_by_text(texts, level))
+            texts = []
             session.commit()
             
+    if texts:
+        session.flush()
+        session.execute(add_level_by_text(texts, level))
     session.commit()
     print(f"Finished {level}: Added {added}, Updated {updated}, Total processed {count}")
 
@@ -141,6 +149,12 @@ def main():
     with Session(engine) as session:
         for level, url in WORDLIST_URLS.items():
             import_wordlist(level, url, session)
+        # Per-level progress counters are rebuilt on each user's next read
+        session.execute(reset_counts())
+        session.commit()
+    
+    # Let running API workers pick up the new words
+    word_catalog.invalidate()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,251 @@
+"""
+Load test for the API.
+Starts the stub LLM server and the API (uvicorn) on local ports, then runs
+concurrent virtual users against /api/session, /api/progress,
+/api/progress/{user_id}, /api/translate and /api/story for a fixed time.
+Prints p50/p95/p99 latency and throughput per endpoint as JSON.
+
+    python scripts/seed_synthetic.py --words 100000 --users 100
+    python scripts/load_test.py --concurrency 32 --duration 30 --llm-latency 0.5
+    python scripts/load_test.py --url http://127.0.0.1:8000 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import defaultdict
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Relative weight of each operation in the traffic mix
+DEFAULT_MIX = "session=4,progress=10,stats=1,translate=2,story=1"
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown operations: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class VirtualUser:
+    """One simulated learner: fetches sessions, answers them, asks for stories"""
+
+    def __init__(self, client, user_id, rng, recorder):
+        self.client = client
+        self.user_id = user_id
+        self.rng = rng
+        self.record = recorder
+        self.words = []  # last session: [{"id", "text"}]
+        self.seq = 0
+
+    async def request(self, name, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.record(name, time.perf_counter() - start, ok)
+        return response
+
+    async def session(self):
+        response = await self.request(
+            "session", "GET", "/api/session",
+            params={"user_id": self.user_id, "count": 10, "compact": "true"}
+        )
+        if response is not None and response.status_code == 200:
+            self.words = [{"id": w["id"], "text": w["text"]} for w in response.json()]
+
+    async def progress(self):
+        if not self.words:
+            return await self.session()
+        self.seq += 1
+        await self.request("progress", "POST", "/api/progress", json={
+            "user_id": self.user_id,
+            "word_id": self.rng.choice(self.words)["id"],
+            "correct": self.rng.random() < 0.7,
+            "seq": self.seq
+        })
+
+    async def stats(self):
+        await self.request("stats", "GET", f"/api/progress/{self.user_id}")
+
+    async def translate(self):
+        roll = self.rng.random()
+        if self.words and roll < 0.6:
+            word = self.rng.choice(self.words)["text"]  # exact hit
+        elif self.words and roll < 0.85:
+            word = self.rng.choice(self.words)["text"] + "s"  # inflected form
+        else:
+            word = "".join(self.rng.choice("bcdfglmnprstv") for _ in range(9))  # unknown: goes to the LLM
+        await self.request("translate", "GET", f"/api/translate/{word}")
+
+    async def story(self):
+        if not self.words:
+            return await self.session()
+        word_ids = [w["id"] for w in self.words[:5]]
+        await self.request("story", "POST", "/api/story", json={"word_ids": word_ids, "theme": "benchmark"})
+
+
+OPERATIONS = {
+    "session": VirtualUser.session,
+    "progress": VirtualUser.progress,
+    "stats": VirtualUser.stats,
+    "translate": VirtualUser.translate,
+    "story": VirtualUser.story,
+}
+
+
+async def run_load(url, concurrency, duration, warmup, users, mix, seed):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    measuring = False
+
+    def record(name, seconds, ok):
+        if not measuring:
+            return
+        if ok:
+            latencies[name].append(seconds)
+        else:
+            errors[name] += 1
+
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        async def worker(index):
+            rng = random.Random(seed + index)
+            user = VirtualUser(client, f"bench_user_{index % users:05d}", rng, record)
+            await user.session()
+            while time.perf_counter() < deadline:
+                await OPERATIONS[rng.choices(names, weights)[0]](user)
+
+        deadline = time.perf_counter() + warmup + duration
+        tasks = [asyncio.create_task(worker(i)) for i in range(concurrency)]
+        await asyncio.sleep(warmup)
+        measuring = True
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    report = {}
+    for name in names:
+        values = sorted(latencies[name])
+        report[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2) if values else None,
+            "p95_ms": round(percentile(values, 95) * 1000, 2) if values else None,
+            "p99_ms": round(percentile(values, 99) * 1000, 2) if values else None,
+            "max_ms": round(values[-1] * 1000, 2) if values else None,
+        }
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "total_errors": sum(errors.values()),
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": report,
+    }
+
+
+def start_process(args, env):
+    return subprocess.Popen(
+        [sys.executable] + args, cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="test an already running API instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="port for the API started by this script")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="stub LLM seconds per reply")
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users running at once")
+    parser.add_argument("--users", type=int, default=100, help="distinct seeded users (bench_user_NNNNN)")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    processes = []
+    url = args.url
+    try:
+        if url is None:
+            env = dict(os.environ)
+            env.update({
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+                "OPENAI_API_KEY": "stub",
+            })
+            processes.append(start_process([
+                "scripts/stub_llm_server.py", "--port", str(args.llm_port), "--latency", str(args.llm_latency)
+            ], env))
+            wait_ready(f"http://127.0.0.1:{args.llm_port}/stats")
+            processes.append(start_process([
+                "-m", "uvicorn", "main:app", "--port", str(args.port),
+                "--workers", str(args.workers), "--log-level", "warning"
+            ], env))
+            url = f"http://127.0.0.1:{args.port}"
+            wait_ready(f"{url}/health")
+
+        result = asyncio.run(run_load(
+            url, args.concurrency, args.duration, args.warmup, args.users, args.mix, args.seed
+        ))
+        result["config"] = {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "llm_latency_s": args.llm_latency if args.url is None else None,
+            "workers": args.workers if args.url is None else None,
+            "mix": args.mix,
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Script to seed a synthetic dictionary and users for benchmarks.
+Words get made-up but pronounceable spellings, level tags, Collins/Oxford
+ranks and exchange forms; users get progress rows spread over all mastery
+levels, some due for review. The same --seed gives the same data.
+
+    python scripts/seed_synthetic.py --words 100000 --users 200
+    DATABASE_URL=sqlite:///./bench.db python scripts/seed_synthetic.py --words 1000000
+"""
+import os
+import sys
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlmodel import select
+
+# Add backend directory to path to import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models import UserProgress, Word, WordLevel
+from database import create_db_and_tables, engine
+from services.word_catalog import word_catalog
+from services.word_search import bulk_load
+
+LEVELS = ["Zhongkao", "Gaokao", "CET4", "CET6", "TOEFL", "GRE", "Kaoyan"]
+POS = ["n.", "v.", "adj.", "adv."]
+SYLLABLES = [
+    c + v for c in ["b", "c", "d", "f", "g", "l", "m", "n", "p", "r", "s", "t", "v", "pr", "st", "tr"]
+    for v in ["a", "e", "i", "o", "u", "ai", "ou"]
+]
+BATCH_SIZE = 5000
+
+
+def synthetic_text(n):
+    """
+    Unique spelling for every n, built from syllables (base-len(SYLLABLES)
+    digits) and ending in "q" so it never clashes with a real word
+    """
+    parts = []
+    while True:
+        n, digit = divmod(n, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+        if n == 0:
+            break
+        n -= 1
+    return "".join(reversed(parts)) + "q"
+
+
+def synthetic_word(word_id, text, rng):
+    levels = rng.sample(LEVELS, rng.choice([1, 1, 2]))
+    level_str = ",".join(levels)
+    pos = rng.choice(POS)
+    definitions = [
+        {"pos": pos, "meaning": f"释义{word_id}", "tags": level_str},
+        {"pos": rng.choice(POS), "meaning": f"引申义{word_id}", "tags": level_str},
+    ]
+    word = {
+        "id": word_id,
+        "text": text,
+        "definition": f"{pos} 释义{word_id}",
+        "definition_json": definitions,
+        "phonetic": f"/{text}/",
+        "level": level_str,
+        "collins": rng.choice([0, 0, 1, 2, 3, 4, 5]),
+        "oxford": rng.choice([0, 0, 0, 1]),
+        "tag": " ".join(l.lower() for l in levels),
+        "exchange": f"s:{text}s/d:{text}d" if pos in ("n.", "v.") else None,
+    }
+    return word, [{"word_id": word_id, "level": level} for level in levels]
+
+
+def seed_words(conn, count, rng):
+    start = (conn.execute(select(func.max(Word.id))).scalar() or 0) + 1
+    offset = (conn.execute(select(func.count()).select_from(Word)).scalar() or 0)
+    words, levels = [], []
+    for i in range(count):
+        word, word_levels = synthetic_word(start + i, synthetic_text(offset + i), rng)
+        words.append(word)
+        levels.extend(word_levels)
+        if len(words) >= BATCH_SIZE:
+            conn.execute(Word.__table__.insert(), words)
+            conn.execute(WordLevel.__table__.insert(), levels)
+            words, levels = [], []
+            if (i + 1) % (BATCH_SIZE * 20) == 0:
+                print(f"Inserted {i + 1} words...")
+    if words:
+        conn.execute(Word.__table__.insert(), words)
+        conn.execute(WordLevel.__table__.insert(), levels)
+    return start, start + count - 1
+
+
+def seed_users(conn, users, per_user, first_id, last_id, rng):
+    now = datetime.utcnow()
+    rows = []
+    for u in range(users):
+        user_id = f"bench_user_{u:05d}"
+        word_ids = rng.sample(range(first_id, last_id + 1), min(per_user, last_id - first_id + 1))
+        for word_id in word_ids:
+            mastery = rng.choice([0, 1, 1, 2, 2, 3])
+            reviewed = now - timedelta(minutes=rng.randint(1, 60 * 24 * 14))
+            # About a third of unmastered words are due now
+            due = None if mastery >= 3 else now + timedelta(minutes=rng.randint(-60 * 24, 60 * 24 * 2))
+            rows.append({
+                "user_id": user_id,
+                "word_id": word_id,
+                "mastery_count": mastery,
+                "is_mastered": mastery >= 3,
+                "last_reviewed": reviewed,
+                "next_due": due,
+                "last_seq": 0,
+            })
+            if len(rows) >= BATCH_SIZE:
+                conn.execute(UserProgress.__table__.insert(), rows)
+                rows = []
+    if rows:
+        conn.execute(UserProgress.__table__.insert(), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=100000, help="synthetic words to add (up to 1M)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--progress-per-user", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not 0 < args.words <= 1_000_000:
+        parser.error("--words must be between 1 and 1000000")
+
+    create_db_and_tables()
+    rng = random.Random(args.seed)
+    with bulk_load(engine), engine.begin() as conn:
+        first_id, last_id = seed_words(conn, args.words, rng)
+        print(f"Inserted words {first_id}..{last_id}")
+        seed_users(conn, args.users, args.progress_per_user, first_id, last_id, rng)
+        print(f"Inserted progress for {args.users} users")
+
+    # Let running API workers pick up the new words
+    word_catalog.invalidate()
+    print("Finished synthetic seed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+Answers story prompts in the [ENGLISH] --- [CHINESE] format, word
+prompts with a short definition, and JSON-mode word lists with a
+definition per word (null for anything that is not plain letters), after
+a configurable delay. Streaming requests get the reply in small chunks.
+
+    python scripts/stub_llm_server.py --port 9100 --latency 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Stub LLM")
+app.state.latency = 0.0
+app.state.chunk_delay = 0.0
+app.state.requests = 0
+
+CHUNK_CHARS = 8
+
+
+def fake_reply(messages: list[dict], json_mode: bool = False) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    if json_mode:
+        match = re.search(r"\[.*\]", prompt, re.S)
+        words = json.loads(match.group(0)) if match else []
+        return json.dumps({
+            w: "测试释义" if re.fullmatch(r"[a-z][a-z'\-]*", w) else None for w in words
+        }, ensure_ascii=False)
+    if "[ENGLISH]" in prompt:
+        words = list(dict.fromkeys(re.findall(r"\*\*([A-Za-z\-']+)\*\*", prompt)))
+        english = "A stub story about " + ", ".join(f"**{w}**" for w in words) + "."
+        chinese = "一个关于" + "、".join(f"**{w}**" for w in words) + "的测试故事。"
+        return f"[ENGLISH]\n{english}\n\n---\n\n[CHINESE]\n{chinese}"
+    return "测试释义"
+
+
+def usage(messages: list[dict], reply: str) -> dict:
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    completion_tokens = len(reply) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+async def stream_reply(completion_id: str, model: str, reply: str):
+    for i in range(0, len(reply), CHUNK_CHARS):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": reply[i:i + CHUNK_CHARS]}, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(app.state.chunk_delay)
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    app.state.requests += 1
+    await asyncio.sleep(app.state.latency)
+
+    messages = body.get("messages", [])
+    json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+    reply = fake_reply(messages, json_mode)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    if body.get("stream"):
+        return StreamingResponse(
+            stream_reply(completion_id, body.get("model", "stub"), reply),
+            media_type="text/event-stream"
+        )
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": reply},
+            "finish_reason": "stop"
+        }],
+        "usage": usage(messages, reply)
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "requests": app.state.requests,
+        "latency": app.state.latency,
+        "chunk_delay": app.state.chunk_delay
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each reply")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    args = parser.parse_args()
+
+    app.state.latency = args.latency
+    app.state.chunk_delay = args.chunk_delay
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ Voca 语刻 - Seed Data
 
 from database import get_session, create_db_and_tables
 from models import Word
+from services.word_catalog import word_catalog
+from services.word_levels import add_level_by_text
 
 
 SEED_WORDS = [
@@ -57,7 +59,12 @@ def seed_database():
             else:
                 print(f"○ Skipped (exists): {word_data['text']}")
         
+        session.flush()
+        for level in {w["level"] for w in SEED_WORDS}:
+            texts = [w["text"] for w in SEED_WORDS if w["level"] == level]
+            session.execute(add_level_by_text(texts, level))
         session.commit()
+        word_catalog.invalidate()
         print(f"\n🎉 Seeded {len(SEED_WORDS)} words successfully!")
 
 
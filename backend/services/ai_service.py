@@ -3,38 +3,30 @@ Voca 语刻 - AI Story Generation Service
 OpenAI-compatible API wrapper for generating contextual stories
 """
 
-import os
 import hashlib
-from openai import OpenAI
-from dotenv import load_dotenv
+import logging
+from typing import AsyncIterator, Optional
 
-load_dotenv()
+from services.llm_client import llm
 
-# Initialize OpenAI client (compatible with other providers)
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY", "your-api-key-here"),
-    base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-)
+logger = logging.getLogger(__name__)
 
 
-def generate_word_hash(word_ids: list[int]) -> str:
-    """Generate a hash for caching stories"""
-    sorted_ids = sorted(word_ids)
+def generate_word_hash(word_ids: list[int], theme: Optional[str] = None) -> str:
+    """Generate a hash for caching stories (word order does not matter)"""
+    sorted_ids = sorted(set(word_ids))
     id_string = ",".join(map(str, sorted_ids))
+    if theme:
+        id_string += f"|{theme}"
     return hashlib.sha256(id_string.encode()).hexdigest()[:16]
 
 
-async def generate_story_with_translation(words: list[dict], theme: str = "量化投资") -> dict:
-    """
-    Generate an engaging story using the given words, along with full translation
-    
-    Args:
-        words: List of word dicts with 'text' and 'definition' keys
-        theme: Theme for the story (e.g., "量化投资", "科技创业")
-    
-    Returns:
-        Dict with 'content' (English story) and 'translation' (Chinese translation)
-    """
+# Sampling parameters for story generation
+STORY_PARAMS = {"temperature": 0.7, "max_tokens": 1200}
+
+
+def build_story_messages(words: list[dict], theme: str = "量化投资") -> list[dict]:
+    """Chat messages asking for a story that uses every word, plus its translation"""
     # Build word list with definitions
     word_texts = [w['text'] for w in words]
     word_list = "\n".join([
@@ -70,61 +62,174 @@ async def generate_story_with_translation(words: list[dict], theme: str = "量
 [CHINESE]
 （这里输出对应的中文翻译，目标单词用**粗体**标记并括号注明英文原词）"""
 
-    print(f"[AI Service] Generating story with {word_count} words: {word_texts}")
+    return [
+        {
+            "role": "system", 
+            "content": f"You are a vocabulary learning content creator. You MUST use ALL {word_count} words provided. Output in the exact format requested with [ENGLISH] and [CHINESE] sections separated by ---."
+        },
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_story(content: str) -> dict:
+    """Split a model response into the English story and its Chinese translation"""
+    english_story = content
+    chinese_translation = ""
+    
+    if "---" in content:
+        parts = content.split("---")
+        if len(parts) >= 2:
+            english_part = parts[0]
+            chinese_part = parts[1]
+            
+            # Clean up markers
+            english_story = english_part.replace("[ENGLISH]", "").strip()
+            chinese_translation = chinese_part.replace("[CHINESE]", "").strip()
     
+    return {
+        "content": english_story,
+        "translation": chinese_translation
+    }
+
+
+class StorySectionParser:
+    """
+    Incremental version of parse_story for streamed responses
+    
+    feed() takes raw text deltas and returns (section, text) pieces, where
+    section is "english" or "chinese". Markers are dropped, and text that
+    could be the start of a marker is held back until the next delta.
+    """
+    
+    SEPARATOR = "---"
+    MARKERS = {"english": "[ENGLISH]", "chinese": "[CHINESE]"}
+    
+    def __init__(self):
+        self.section = "english"  # then "chinese", then "ignored"
+        self._buffer = ""
+        self._at_start = True  # Leading whitespace of a section is skipped
+        self.parts = {"english": [], "chinese": []}
+    
+    def _held_back(self) -> int:
+        """Length of the buffer tail that may still become a marker"""
+        candidates = (self.SEPARATOR, self.MARKERS.get(self.section, ""))
+        longest = max(len(m) for m in candidates)
+        for n in range(min(len(self._buffer), longest), 0, -1):
+            tail = self._buffer[-n:]
+            if any(m.startswith(tail) and m != tail for m in candidates if m):
+                return n
+        return 0
+    
+    def _emit(self, text: str, events: list):
+        if self._at_start:
+            text = text.lstrip()
+        if text:
+            self._at_start = False
+            self.parts[self.section].append(text)
+            events.append((self.section, text))
+    
+    def feed(self, delta: str) -> list[tuple[str, str]]:
+        events = []
+        if self.section == "ignored":
+            return events
+        self._buffer += delta
+        
+        while True:
+            marker = self.MARKERS[self.section]
+            self._buffer = self._buffer.replace(marker, "")
+            cut = self._buffer.find(self.SEPARATOR)
+            if cut < 0:
+                break
+            self._emit(self._buffer[:cut], events)
+            self._buffer = self._buffer[cut + len(self.SEPARATOR):]
+            self._at_start = True
+            if self.section == "english":
+                self.section = "chinese"
+            else:
+                # parse_story only keeps the first two sections
+                self.section = "ignored"
+                self._buffer = ""
+                return events
+        
+        hold = self._held_back()
+        self._emit(self._buffer[:len(self._buffer) - hold], events)
+        self._buffer = self._buffer[len(self._buffer) - hold:]
+        return events
+    
+    def close(self) -> list[tuple[str, str]]:
+        """Flush whatever is still buffered at the end of the stream"""
+        events = []
+        if self.section != "ignored":
+            self._emit(self._buffer, events)
+        self._buffer = ""
+        return events
+    
+    def result(self) -> dict:
+        """The assembled story, as parse_story would return it"""
+        return {
+            "content": "".join(self.parts["english"]).strip(),
+            "translation": "".join(self.parts["chinese"]).strip()
+        }
+
+
+def fallback_story(words: list[dict], error: Exception) -> dict:
+    """Plain word list used when the model call fails"""
+    word_count = len(words)
+    fallback_en = f"This story uses {word_count} vocabulary words: " + ", ".join([f"**{w['text']}**" for w in words]) + "."
+    fallback_cn = f"本故事使用了 {word_count} 个词汇：" + "、".join([f"**{w['text']}**（{w['definition']}）" for w in words])
+    fallback_cn += f"\n\n[AI story generation failed: {str(error)}]"
+    
+    return {
+        "content": fallback_en,
+        "translation": fallback_cn,
+        "fallback": True  # Not worth caching
+    }
+
+
+async def generate_story_with_translation(words: list[dict], theme: str = "量化投资") -> dict:
+    """
+    Generate an engaging story using the given words, along with full translation
+    
+    Args:
+        words: List of word dicts with 'text' and 'definition' keys
+        theme: Theme for the story (e.g., "量化投资", "科技创业")
+    
+    Returns:
+        Dict with 'content' (English story) and 'translation' (Chinese translation)
+    """
     try:
-        response = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "deepseek-chat"),
-            messages=[
-                {
-                    "role": "system", 
-                    "content": f"You are a vocabulary learning content creator. You MUST use ALL {word_count} words provided. Output in the exact format requested with [ENGLISH] and [CHINESE] sections separated by ---."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1200
-        )
+        response = await llm.chat(messages=build_story_messages(words, theme), **STORY_PARAMS)
         content = response.choices[0].message.content
-        print(f"[AI Service] Response received, length: {len(content)}")
         
         # Parse the response to extract English and Chinese parts
-        english_story = content
-        chinese_translation = ""
-        
-        if "---" in content:
-            parts = content.split("---")
-            if len(parts) >= 2:
-                english_part = parts[0]
-                chinese_part = parts[1]
-                
-                # Clean up markers
-                english_story = english_part.replace("[ENGLISH]", "").strip()
-                chinese_translation = chinese_part.replace("[CHINESE]", "").strip()
+        result = parse_story(content)
         
-        print(f"[AI Service] English story length: {len(english_story)}")
-        print(f"[AI Service] Chinese translation length: {len(chinese_translation)}")
+        logger.debug("Story generated", extra={
+            "words": len(words), "story_chars": len(result["content"]),
+            "translation_chars": len(result["translation"])
+        })
         
-        return {
-            "content": english_story,
-            "translation": chinese_translation
-        }
+        return result
         
     except Exception as e:
-        print(f"[AI Service] Error: {e}")
-        # Fallback
-        fallback_parts = []
-        for w in words:
-            fallback_parts.append(f"**{w['text']}** ({w['definition']})")
-        
-        fallback_en = f"This story uses {word_count} vocabulary words: " + ", ".join([f"**{w['text']}**" for w in words]) + "."
-        fallback_cn = f"本故事使用了 {word_count} 个词汇：" + "、".join([f"**{w['text']}**（{w['definition']}）" for w in words])
-        fallback_cn += f"\n\n[AI story generation failed: {str(e)}]"
-        
-        return {
-            "content": fallback_en,
-            "translation": fallback_cn
-        }
+        logger.warning("Story generation failed, using fallback: %s", e)
+        return fallback_story(words, e)
+
+
+async def stream_story_with_translation(words: list[dict], theme: str = "量化投资") -> AsyncIterator[tuple[str, str]]:
+    """
+    Stream a story as ("english" | "chinese", text) deltas as they arrive
+    
+    The last item is ("done", story) with the assembled story dict. Upstream
+    errors are raised to the caller.
+    """
+    parser = StorySectionParser()
+    async for delta in llm.stream_chat(messages=build_story_messages(words, theme), **STORY_PARAMS):
+        for event in parser.feed(delta):
+            yield event
+    for event in parser.close():
+        yield event
+    yield "done", parser.result()
 
 
 # Keep old function for compatibility
@@ -0,0 +1,284 @@
+"""
+Voca 语刻 - Catalog Snapshot
+Compact, read-only binary image of the word catalog. Worker processes map
+the same file, so the catalog lives once in the OS page cache instead of
+once per process, and a worker starts without querying every word.
+
+Layout (native byte order, sections aligned to 8 bytes):
+
+    b"VOCACAT3" | u32 directory size | directory (JSON) | sections...
+
+The directory holds the catalog version, level and part-of-speech names,
+a fingerprint of each level's ids and weights, and (offset, length) of
+each section:
+
+    ids                  u32[n]    word ids, ascending (also the ALL partition)
+    pos                  u16[n]    part-of-speech code of each word
+    weights              f32[n]    sampling weight of each word
+    level_offsets        u32[n+1]  word i has level codes [offsets[i], offsets[i+1])
+    level_codes          u16[m]
+    text_offsets, texts            UTF-8 strings, word i is texts[offsets[i]:offsets[i+1]]
+    definition_offsets, definitions
+    partition:<level>    u32[]     word ids of a level, ascending
+    bucket:<level>:<pos> u32[]     word ids of a level with one part of speech
+    alias_prob:<level>   f32[]     alias table over the level's partition
+    alias_index:<level>  u32[]     (see services.sampling)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from services.sampling import build_alias
+
+MAGIC = b"VOCACAT3"
+ALL_LEVELS = "ALL"
+ALIGN = 8
+
+# (type code, bytes per item) of each numeric section
+TYPES = {"I": 4, "H": 2, "B": 1, "f": 4}
+
+
+def _typed(values, code: str) -> array:
+    data = array(code, values)
+    assert data.itemsize == TYPES[code], f"array('{code}') is not {TYPES[code]} bytes here"
+    return data
+
+
+def _strings(values: list[str]) -> tuple[array, bytes]:
+    """Offsets (n+1) and the concatenated UTF-8 bytes of a list of strings"""
+    blob = bytearray()
+    offsets = array("I", [0])
+    for value in values:
+        blob += (value or "").encode()
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _fingerprint(ids: array, weights: array) -> str:
+    return hashlib.blake2b(ids.tobytes() + weights.tobytes(), digest_size=16).hexdigest()
+
+
+def build_snapshot(
+    version: int, words: Iterable[tuple], levels: Iterable[tuple[str, int]],
+    previous: Optional["CatalogSnapshot"] = None
+) -> bytes:
+    """
+    Serialize a catalog.
+
+    words: (id, text, definition, pos, weight) rows; levels: (level, word_id)
+    rows. Level rows for unknown word ids are skipped. Alias tables of levels
+    whose ids and weights are unchanged since `previous` are copied from it
+    instead of being rebuilt, without gathering or hashing their weights.
+    """
+    words = sorted(words)
+    ids = [w[0] for w in words]
+    index = {word_id: i for i, word_id in enumerate(ids)}
+    pos_names = sorted({w[3] for w in words})
+    pos_code = {name: code for code, name in enumerate(pos_names)}
+    word_pos = [pos_code[w[3]] for w in words]
+
+    level_rows = sorted((level, word_id) for level, word_id in levels if word_id in index)
+    level_names = sorted({level for level, _ in level_rows})
+    level_code = {name: code for code, name in enumerate(level_names)}
+
+    # Level codes per word, in level-name order (build_distractors takes the first)
+    per_word: list[list[int]] = [[] for _ in ids]
+    partitions: dict[str, list[int]] = {}
+    buckets: dict[tuple[str, str], list[int]] = {}
+    for level, word_id in level_rows:
+        i = index[word_id]
+        per_word[i].append(level_code[level])
+        partitions.setdefault(level, []).append(word_id)
+        buckets.setdefault((level, pos_names[word_pos[i]]), []).append(word_id)
+    for i, word_id in enumerate(ids):
+        buckets.setdefault((ALL_LEVELS, pos_names[word_pos[i]]), []).append(word_id)
+
+    level_offsets = array("I", [0])
+    level_codes: list[int] = []
+    for codes in per_word:
+        level_codes.extend(codes)
+        level_offsets.append(len(level_codes))
+    weights = _typed([w[4] for w in words], "f")
+    text_offsets, texts = _strings([w[1] for w in words])
+    definition_offsets, definitions = _strings([w[2] for w in words])
+
+    sections = {
+        "ids": _typed(ids, "I"),
+        "pos": _typed(word_pos, "H"),
+        "weights": weights,
+        "level_offsets": level_offsets,
+        "level_codes": _typed(level_codes, "H"),
+        "text_offsets": text_offsets,
+        "texts": texts,
+        "definition_offsets": definition_offsets,
+        "definitions": definitions,
+    }
+    for level, word_ids in partitions.items():
+        sections[f"partition:{level}"] = _typed(word_ids, "I")
+    for (level, pos), word_ids in buckets.items():
+        sections[f"bucket:{level}:{pos}"] = _typed(word_ids, "I")
+
+    # Only levels holding a new or reweighted word, or whose word set
+    # changed, get new alias tables; the rest are copied from `previous`
+    reweighted = []
+    if previous is not None:
+        old_weights = dict(zip(previous.ids, previous.weights))
+        reweighted = [i for i, word_id in enumerate(ids) if old_weights.get(word_id) != weights[i]]
+    stale = {level_names[code] for i in reweighted for code in per_word[i]}
+    if reweighted:
+        stale.add(ALL_LEVELS)
+
+    fingerprints = {}
+    for level, word_ids in [(ALL_LEVELS, sections["ids"])] + [
+        (level, sections[f"partition:{level}"]) for level in level_names
+    ]:
+        old_ids = previous.partitions.get(level) if previous is not None else None
+        unchanged = (
+            old_ids is not None and level not in stale and level in previous.alias_tables
+            and old_ids.cast("B") == memoryview(word_ids).cast("B")
+        )
+        if unchanged:
+            prob, alias = previous.alias_tables[level]
+            fingerprints[level] = previous.fingerprints[level]
+            sections[f"alias_prob:{level}"] = bytes(prob.cast("B"))
+            sections[f"alias_index:{level}"] = bytes(alias.cast("B"))
+        else:
+            level_weights = weights if level == ALL_LEVELS else _typed((weights[index[i]] for i in word_ids), "f")
+            fingerprints[level] = _fingerprint(word_ids, level_weights)
+            prob, alias = build_alias(level_weights)
+            sections[f"alias_prob:{level}"] = prob
+            sections[f"alias_index:{level}"] = alias
+
+    # Lay the sections out, then write the directory that points at them
+    layout = {}
+    body = bytearray()
+    for name, data in sections.items():
+        raw = data.tobytes() if isinstance(data, array) else data
+        body += b"\0" * (-len(body) % ALIGN)
+        layout[name] = [len(body), len(raw)]
+        body += raw
+    directory = json.dumps({
+        "version": version,
+        "byteorder": sys.byteorder,
+        "count": len(ids),
+        "levels": level_names,
+        "pos": pos_names,
+        "fingerprints": fingerprints,
+        "sections": layout,
+    }, ensure_ascii=False).encode()
+    header = MAGIC + len(directory).to_bytes(4, "little") + directory
+    header += b"\0" * (-len(header) % ALIGN)
+    # Section offsets are relative to the end of the header
+    return header + bytes(body)
+
+
+def write_snapshot(path: str, data: bytes):
+    """Atomically replace the snapshot file (readers keep their old mapping)"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CatalogSnapshot:
+    """Zero-copy view of a serialized catalog (a mapped file or bytes)"""
+
+    def __init__(self, buffer):
+        self._buffer = buffer  # keeps the mmap alive while views exist
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a catalog snapshot")
+        size = int.from_bytes(view[len(MAGIC):len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4
+        directory = json.loads(bytes(view[start:start + size]))
+        if directory["byteorder"] != sys.byteorder:
+            raise ValueError("catalog snapshot was written on a machine with another byte order")
+        body = start + size + (-(start + size) % ALIGN)
+
+        def section(name: str, code: Optional[str] = None):
+            offset, length = directory["sections"][name]
+            raw = view[body + offset:body + offset + length]
+            return raw.cast(code) if code else raw
+
+        self.version: int = directory["version"]
+        self.level_names: list[str] = directory["levels"]
+        self.pos_names: list[str] = directory["pos"]
+        self.ids = section("ids", "I")
+        self._pos = section("pos", "H")
+        self.weights = section("weights", "f")
+        self.fingerprints: dict[str, str] = directory["fingerprints"]
+        self._level_offsets = section("level_offsets", "I")
+        self._level_codes = section("level_codes", "H")
+        self._text_offsets = section("text_offsets", "I")
+        self._texts = section("texts")
+        self._definition_offsets = section("definition_offsets", "I")
+        self._definitions = section("definitions")
+
+        self.partitions = {ALL_LEVELS: self.ids}
+        self.buckets = {}
+        self.alias_tables = {
+            level: (section(f"alias_prob:{level}", "f"), section(f"alias_index:{level}", "I"))
+            for level in self.fingerprints
+        }
+        for name in directory["sections"]:
+            kind, _, key = name.partition(":")
+            if kind == "partition":
+                self.partitions[key] = section(name, "I")
+            elif kind == "bucket":
+                level, _, pos = key.rpartition(":")
+                self.buckets[(level, pos)] = section(name, "I")
+
+    @classmethod
+    def open(cls, path: str) -> "CatalogSnapshot":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @staticmethod
+    def read_version(path: str) -> Optional[int]:
+        """Version recorded in a snapshot file, without mapping the sections"""
+        try:
+            with open(path, "rb") as f:
+                head = f.read(len(MAGIC) + 4)
+                if head[:len(MAGIC)] != MAGIC:
+                    return None
+                return json.loads(f.read(int.from_bytes(head[len(MAGIC):], "little")))["version"]
+        except (OSError, ValueError):
+            return None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _index(self, word_id: int) -> Optional[int]:
+        i = bisect_left(self.ids, word_id)
+        return i if i < len(self.ids) and self.ids[i] == word_id else None
+
+    def levels_of(self, word_id: int) -> tuple[str, ...]:
+        i = self._index(word_id)
+        if i is None:
+            return ()
+        codes = self._level_codes[self._level_offsets[i]:self._level_offsets[i + 1]]
+        return tuple(self.level_names[c] for c in codes)
+
+    def pos_of(self, word_id: int) -> Optional[str]:
+        i = self._index(word_id)
+        return None if i is None else self.pos_names[self._pos[i]]
+
+    def text_of(self, word_id: int) -> Optional[str]:
+        i = self._index(word_id)
+        if i is None:
+            return None
+        return bytes(self._texts[self._text_offsets[i]:self._text_offsets[i + 1]]).decode()
+
+    def definition_of(self, word_id: int) -> Optional[str]:
+        i = self._index(word_id)
+        if i is None:
+            return None
+        return bytes(self._definitions[self._definition_offsets[i]:self._definition_offsets[i + 1]]).decode()
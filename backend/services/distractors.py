@@ -0,0 +1,69 @@
+"""
+Voca 语刻 - Distractor Pools
+Wrong-answer definitions for multiple-choice cards, drawn from words of the
+same level and part of speech
+"""
+
+import json
+import os
+import random
+import re
+from typing import Optional
+
+# How many candidate definitions are precomputed into Word.options
+DISTRACTOR_POOL_SIZE = int(os.getenv("DISTRACTOR_POOL_SIZE", "12"))
+
+_POS_PATTERN = re.compile(r"^\s*([a-z]+)\.")
+
+
+def part_of_speech(definition_json: Optional[list], definition: Optional[str]) -> str:
+    """Primary part of speech, e.g. 'n.', from definition_json or the raw definition"""
+    if definition_json and isinstance(definition_json[0], dict):
+        pos = definition_json[0].get("pos")
+        if pos and pos != "unk.":
+            return pos
+    match = _POS_PATTERN.match(definition or "")
+    return f"{match.group(1)}." if match else "unk."
+
+
+def load_pool(options: Optional[str]) -> list[str]:
+    """Parse the JSON pool stored in Word.options"""
+    if not options:
+        return []
+    try:
+        pool = json.loads(options)
+    except ValueError:
+        return []
+    if not isinstance(pool, list):
+        return []
+    return [d for d in pool if isinstance(d, str)]
+
+
+def dump_pool(pool: list[str]) -> str:
+    """Serialize a pool for Word.options"""
+    return json.dumps(pool, ensure_ascii=False)
+
+
+def pick_from_pool(pool: list[str], definition: str, count: int = 3) -> list[str]:
+    """Draw `count` distractors from a precomputed pool"""
+    candidates = [d for d in pool if d != definition]
+    return random.sample(candidates, min(count, len(candidates)))
+
+
+def distractor_candidates(catalog, level: str, pos: str, word_id: int, count: int) -> list[int]:
+    """
+    Word ids to use as distractors, found through the catalog's runtime index
+
+    Prefers the same level and part of speech, topping up from the whole level
+    when that bucket is too small.
+    """
+    ids = catalog.sample_bucket(level, pos, count, exclude=word_id)
+    if len(ids) < count:
+        seen = set(ids)
+        for extra in catalog.sample_excluding(level, count * 2, word_id):
+            if extra not in seen:
+                ids.append(extra)
+                seen.add(extra)
+            if len(ids) == count:
+                break
+    return ids
@@ -0,0 +1,151 @@
+"""
+Voca 语刻 - Lemma Index
+Maps inflected forms ("arbitraged", "derivatives") to dictionary headwords
+using the ECDICT exchange field, so lookups resolve locally
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_session_maker
+from models import Word
+from services.word_catalog import catalog_version
+
+logger = logging.getLogger(__name__)
+
+# ECDICT exchange kinds that name an inflected form of the headword:
+# p past tense, d past participle, i present participle, 3 third person,
+# r comparative, t superlative, s plural
+INFLECTION_KINDS = set("pdi3rts")
+
+# Stems to try by stripping a suffix: (suffix, replacement). A stem only
+# counts when its own exchange lists the word, so "herring" is not "her"
+SUFFIX_RULES = [
+    ("ies", "y"), ("ied", "y"), ("ier", "y"), ("iest", "y"),
+    ("ves", "f"), ("ves", "fe"),
+    ("es", ""), ("s", ""),
+    ("ed", "e"), ("ed", ""), ("ing", "e"), ("ing", ""),
+    ("er", ""), ("est", ""),
+]
+
+
+def parse_exchange(exchange: Optional[str]) -> list[tuple[str, str]]:
+    """Split 'p:went/d:gone/0:go' into [('p', 'went'), ('d', 'gone'), ('0', 'go')]"""
+    pairs = []
+    for item in (exchange or "").split("/"):
+        kind, sep, form = item.partition(":")
+        form = form.strip().lower()
+        if sep and form:
+            pairs.append((kind.strip(), form))
+    return pairs
+
+
+def suffix_candidates(word: str) -> list[str]:
+    """Possible base forms of a word by stripping common English suffixes"""
+    candidates = []
+    for suffix, replacement in SUFFIX_RULES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 2:
+            stem = word[:-len(suffix)]
+            candidates.append(stem + replacement)
+            # stopped -> stop, bigger -> big
+            if not replacement and len(stem) >= 3 and stem[-1] == stem[-2]:
+                candidates.append(stem[:-1])
+    return list(dict.fromkeys(candidates))
+
+
+class LemmaIndex:
+    """
+    Inflected form -> headword, reloaded when the word catalog changes.
+
+    Like the word catalog, only the first load blocks: a stale index is
+    reloaded in the background while lookups keep using the loaded one.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self._lemmas: dict[str, str] = {}
+        self._forms: dict[str, set[str]] = {}  # headword -> its inflected forms
+        self._version: Optional[int] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    @property
+    def is_current(self) -> bool:
+        return self._version is not None and self._version == catalog_version()
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Load the index if it is missing; start a background reload if it is stale"""
+        if self.is_current:
+            return
+        if self._version is None:
+            await self._load(db)
+        elif self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            async with async_session_maker() as db:
+                await self._load(db)
+        except Exception:
+            # The loaded index keeps serving; the next lookup retries
+            logger.exception("Lemma index reload failed")
+
+    async def _load(self, db: AsyncSession):
+        async with self._lock:
+            if self.is_current:
+                return
+            version = catalog_version()
+            rows = (await db.exec(
+                select(Word.text, Word.exchange).where(Word.exchange != None)
+            )).all()
+            self._build(rows, version)
+
+    async def aclose(self):
+        """Stop a background reload (API shutdown)"""
+        if self._refresh is not None:
+            self._refresh.cancel()
+            await asyncio.gather(self._refresh, return_exceptions=True)
+
+    def _build(self, rows, version: int):
+        lemmas: dict[str, str] = {}
+        referrals: dict[str, str] = {}
+        forms: dict[str, set[str]] = {}
+        for text, exchange in rows:
+            for kind, form in parse_exchange(exchange):
+                if form == text:
+                    continue
+                if kind in INFLECTION_KINDS:
+                    # The headword's own list of forms wins
+                    lemmas.setdefault(form, text)
+                    forms.setdefault(text, set()).add(form)
+                elif kind == "0":
+                    # This row is itself an inflection of `form`
+                    referrals.setdefault(text, form)
+                    forms.setdefault(form, set()).add(text)
+        for form, lemma in referrals.items():
+            lemmas.setdefault(form, lemma)
+
+        self._lemmas = lemmas
+        self._forms = forms
+        self._version = version
+        logger.info("Loaded %d inflected forms", len(lemmas))
+
+    def lemma_of(self, word: str) -> Optional[str]:
+        return self._lemmas.get(word)
+
+    def candidates(self, word: str) -> list[str]:
+        """Headwords to try for a word that has no exact entry, best first"""
+        candidates = []
+        lemma = self.lemma_of(word)
+        if lemma:
+            candidates.append(lemma)
+        # e.g. "leaves" is listed by both "leaf" and "leave"
+        candidates.extend(stem for stem in suffix_candidates(word) if word in self._forms.get(stem, ()))
+        return list(dict.fromkeys(c for c in candidates if c != word))
+
+
+# Shared instance for the whole process
+lemma_index = LemmaIndex()
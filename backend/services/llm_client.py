@@ -0,0 +1,160 @@
+"""
+Voca 语刻 - LLM Client
+One shared AsyncOpenAI client for the process: pooled keep-alive
+connections, a cap on concurrent upstream calls, and coalescing of
+identical in-flight requests
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from services.metrics import metrics
+
+load_dotenv()
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "deepseek-chat")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+
+class LLMClient:
+    """
+    Chat completions against an OpenAI-compatible endpoint.
+
+    Requests with the same model, messages and parameters that overlap in
+    time share a single upstream call.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}  # callers awaiting each in-flight call
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # Created on first use so the pool belongs to the running event loop
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE
+                ),
+                timeout=LLM_TIMEOUT
+            )
+            self._client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY", "your-api-key-here"),
+                base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+                http_client=http_client
+            )
+        return self._client
+
+    @staticmethod
+    def request_key(model: str, messages: list[dict], params: dict) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def chat(self, messages: list[dict], model: Optional[str] = None, **params):
+        """Create a chat completion, joining an identical request if one is running"""
+        model = model or OPENAI_MODEL
+        key = self.request_key(model, messages, params)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._create(model, messages, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+
+        # Shield so one cancelled caller does not cancel the shared call;
+        # the last caller to leave cancels it, since nobody wants the result
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] = self._waiters.get(key, 1) - 1
+            if self._waiters[key] <= 0:
+                self._waiters.pop(key, None)
+
+    async def _create(self, model: str, messages: list[dict], params: dict):
+        async with self._semaphore:
+            self.upstream_calls += 1
+            start = time.perf_counter()
+            try:
+                response = await self.client.chat.completions.create(
+                    model=model, messages=messages, **params
+                )
+            except BaseException:
+                metrics.observe_llm("chat", time.perf_counter() - start, outcome="error")
+                raise
+            metrics.observe_llm("chat", time.perf_counter() - start, usage=response.usage)
+            return response
+
+    async def stream_chat(self, messages: list[dict], model: Optional[str] = None, **params) -> AsyncIterator[str]:
+        """Stream a chat completion as text deltas (never coalesced)"""
+        async with self._semaphore:
+            self.upstream_calls += 1
+            start = time.perf_counter()
+            first_token = True
+            usage = None
+            outcome = "error"
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=model or OPENAI_MODEL, messages=messages, stream=True, **params
+                )
+                async for chunk in stream:
+                    # Only sent by providers that report usage on streams
+                    usage = getattr(chunk, "usage", None) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if first_token:
+                            metrics.llm_first_token.observe(time.perf_counter() - start, kind="stream")
+                            first_token = False
+                        yield chunk.choices[0].delta.content
+                outcome = "ok"
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled"  # the client went away mid-stream
+                raise
+            finally:
+                metrics.observe_llm("stream", time.perf_counter() - start, outcome=outcome, usage=usage)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Mark the error as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+# Shared instance for the whole process
+llm = LLMClient()
@@ -0,0 +1,195 @@
+"""
+Voca 语刻 - Metrics
+In-process latency histograms and counters for HTTP routes, database
+queries and LLM calls, rendered in the Prometheus text format at /metrics
+"""
+
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Upper bounds in seconds; the last bucket (+Inf) is implicit
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = tuple[tuple[str, str], ...]
+
+# Queries run by the request being handled (set by MetricsMiddleware)
+_request_queries: ContextVar[Optional[list[int]]] = ContextVar("request_queries", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set"""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series: dict[Labels, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label set"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._series: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(key)} {value}" for key, value in sorted(self._series.items()))
+        return lines
+
+
+def _labels(key: Labels) -> str:
+    if not key:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in key
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """
+    All metrics of the process.
+
+    Everything runs on the event loop thread (SQLAlchemy's async engines
+    call the cursor hooks there too), so no locking is needed.
+    """
+
+    def __init__(self):
+        self.http_duration = Histogram(
+            "voca_http_request_duration_seconds", "Time to handle a request, by route", LATENCY_BUCKETS
+        )
+        self.http_requests = Counter("voca_http_requests_total", "Requests handled, by route and status")
+        self.request_queries = Histogram(
+            "voca_http_request_db_queries", "Database queries run by one request, by route", COUNT_BUCKETS
+        )
+        self.db_duration = Histogram(
+            "voca_db_query_duration_seconds", "Database query time, by engine and statement", QUERY_BUCKETS
+        )
+        self.llm_duration = Histogram(
+            "voca_llm_request_duration_seconds", "Upstream LLM call time, by kind and outcome", LATENCY_BUCKETS
+        )
+        self.llm_first_token = Histogram(
+            "voca_llm_time_to_first_token_seconds", "Time to the first streamed delta", LATENCY_BUCKETS
+        )
+        self.llm_tokens = Counter("voca_llm_tokens_total", "Tokens reported by the LLM, by kind and type")
+        self._all = (
+            self.http_duration, self.http_requests, self.request_queries,
+            self.db_duration, self.llm_duration, self.llm_first_token, self.llm_tokens
+        )
+
+    def observe_llm(self, kind: str, seconds: float, outcome: str = "ok", usage=None):
+        """Record one LLM call; usage is the OpenAI `usage` object if the reply had one"""
+        self.llm_duration.observe(seconds, kind=kind, outcome=outcome)
+        if usage is not None:
+            self.llm_tokens.inc(usage.prompt_tokens or 0, kind=kind, type="prompt")
+            self.llm_tokens.inc(usage.completion_tokens or 0, kind=kind, type="completion")
+
+    def instrument_engine(self, engine, name: str):
+        """Time every statement of an (async) engine through cursor events"""
+        if not METRICS_ENABLED:
+            return
+        sync_engine = getattr(engine, "sync_engine", engine)
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["query_start"].pop()
+            operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+            self.db_duration.observe(elapsed, engine=name, operation=operation)
+            queries = _request_queries.get()
+            if queries is not None:
+                queries[0] += 1
+
+        @event.listens_for(sync_engine, "handle_error")
+        def failed(context):
+            starts = context.connection.info.get("query_start") if context.connection is not None else None
+            if starts:
+                starts.pop()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._all:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request until its last body chunk.
+    Requests are labelled by route template (/api/progress/{user_id}), so
+    path parameters do not create new series.
+    """
+
+    def __init__(self, app, registry: "Metrics"):
+        self.app = app
+        self.metrics = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = [500]
+        queries = [0]
+        token = _request_queries.set(queries)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            self.metrics.http_duration.observe(time.perf_counter() - start, method=method, route=path)
+            self.metrics.http_requests.inc(method=method, route=path, status=str(status[0]))
+            self.metrics.request_queries.observe(queries[0], method=method, route=path)
+
+
+# Shared instance for the whole process
+metrics = Metrics()
@@ -0,0 +1,384 @@
+"""
+Voca 语刻 - Progress Buffer
+Write-behind mode for answers: progress is applied to in-memory state that
+serves reads, journaled to a local append-only file, and flushed to the
+userprogress table in coalesced batches by a background task
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_session_maker, upsert
+from models import ProgressUpdate, UserProgress
+from services import progress_stats, scheduler
+from services.word_catalog import word_catalog
+
+try:
+    import fcntl
+except ImportError:  # Windows: nothing stops two workers sharing a journal
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_BUFFER_ENABLED = os.getenv("PROGRESS_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "1.0"))  # seconds between flushes
+PROGRESS_FLUSH_SIZE = int(os.getenv("PROGRESS_FLUSH_SIZE", "500"))  # dirty rows that trigger an early flush
+PROGRESS_JOURNAL_PATH = os.getenv("PROGRESS_JOURNAL_PATH", "./progress.journal")
+# fsync every journal write: survives power loss, not just a crashed process
+PROGRESS_JOURNAL_FSYNC = os.getenv("PROGRESS_JOURNAL_FSYNC", "false").lower() in ("1", "true", "yes")
+
+# Rows per upsert statement (7 bound parameters each)
+WRITE_CHUNK = 500
+
+Key = tuple[str, int]  # (user_id, word_id)
+
+
+@dataclass
+class ProgressState:
+    """A user's progress on one word, as the next flush will write it"""
+    mastery_count: int = 0
+    is_mastered: bool = False
+    last_reviewed: Optional[datetime] = None
+    next_due: Optional[datetime] = None
+    last_seq: int = 0
+    base_mastery: int = 0  # mastery_count in the database, for the stats overlay
+    version: int = 0  # bumped by every applied answer
+
+    def row(self, key: Key) -> dict:
+        return {
+            "user_id": key[0],
+            "word_id": key[1],
+            "mastery_count": self.mastery_count,
+            "is_mastered": self.is_mastered,
+            "last_reviewed": self.last_reviewed,
+            "next_due": self.next_due,
+            "last_seq": self.last_seq,
+        }
+
+
+def _encode(row: dict) -> str:
+    return json.dumps({
+        **row,
+        "last_reviewed": row["last_reviewed"] and row["last_reviewed"].isoformat(),
+        "next_due": row["next_due"] and row["next_due"].isoformat(),
+    }, ensure_ascii=False)
+
+
+def _decode(line: str) -> dict:
+    row = json.loads(line)
+    for name in ("last_reviewed", "next_due"):
+        row[name] = row[name] and datetime.fromisoformat(row[name])
+    return row
+
+
+class ProgressBuffer:
+    """
+    Unflushed progress per user, with a journal that makes it crash-safe.
+
+    Every applied answer appends the word's full new state to the current
+    journal segment before the request returns. A flush starts a new
+    segment, upserts the dirty rows in one transaction, and then deletes
+    the older segments; segments left by a crash are replayed on start.
+    Only flushed rows leave memory, so the buffer holds at most a few
+    flush intervals of answers.
+
+    The buffer is per process: run a single worker (a second one fails
+    to take the journal lock).
+    """
+
+    def __init__(
+        self,
+        journal_path: str = PROGRESS_JOURNAL_PATH,
+        flush_interval: float = PROGRESS_FLUSH_INTERVAL,
+        flush_size: int = PROGRESS_FLUSH_SIZE,
+        fsync: bool = PROGRESS_JOURNAL_FSYNC
+    ):
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.fsync = fsync
+        self._states: dict[str, dict[int, ProgressState]] = {}
+        self._dirty: set[Key] = set()
+        self._segment = 0
+        self._journal = None
+        self._lock_file = None
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self.applied = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.flush_errors = 0
+        self.replayed = 0
+
+    async def start(self):
+        """Take the journal, replay what a previous run left, start flushing"""
+        self._lock_journal()
+        segments = self._segments()
+        if segments:
+            self.replayed = await self._replay(segments)
+            for _, path in segments:
+                os.remove(path)
+            logger.info("Replayed progress journal", extra={"rows": self.replayed})
+        self._segment = segments[-1][0] + 1 if segments else 1
+        self._open_segment()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def apply(self, db: AsyncSession, updates: Iterable[ProgressUpdate]) -> dict[Key, ProgressState]:
+        """
+        Apply answers in order; answers whose seq is not newer than the
+        word's are skipped. Returns the resulting state of every word.
+        """
+        updates = list(updates)
+        loaded = await self._load(db, {(u.user_id, u.word_id) for u in updates})
+
+        # No awaits from here to the journal write: a flush sees either
+        # none or all of these answers, in memory and in the journal
+        now = datetime.utcnow()
+        states = {}
+        lines = []
+        for update in updates:
+            key = (update.user_id, update.word_id)
+            # Buffered state wins over the row read above, which a flush may have just replaced
+            state = states.get(key) or self.user_states(key[0]).get(key[1]) or loaded[key]
+            states[key] = state
+            if update.seq is not None and update.seq <= state.last_seq:
+                continue
+            if update.seq is not None:
+                state.last_seq = update.seq
+            if update.correct:
+                state.mastery_count = min(state.mastery_count + 1, 3)
+                if state.mastery_count >= 3:
+                    state.is_mastered = True
+            state.last_reviewed = now
+            state.next_due = scheduler.next_due(state.mastery_count, update.correct, now)
+            state.version += 1
+            self._states.setdefault(key[0], {})[key[1]] = state
+            self._dirty.add(key)
+            lines.append(_encode(state.row(key)))
+        if lines:
+            self._journal.write("\n".join(lines) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                await asyncio.to_thread(os.fsync, self._journal.fileno())
+            self.applied += len(lines)
+        if len(self._dirty) >= self.flush_size:
+            self._wake.set()
+        return states
+
+    def user_states(self, user_id: str) -> dict[int, ProgressState]:
+        """The user's unflushed words (word_id -> state); do not modify"""
+        return self._states.get(user_id, {})
+
+    def pending_changes(self, user_id: str) -> list[tuple[int, int, int]]:
+        """(word_id, stored mastery, buffered mastery) of the user's unflushed words"""
+        return [
+            (word_id, state.base_mastery, state.mastery_count)
+            for word_id, state in self.user_states(user_id).items()
+        ]
+
+    async def _load(self, db: AsyncSession, keys: set[Key]) -> dict[Key, ProgressState]:
+        """States of `keys`, reading the words that are not buffered in one query"""
+        states = {}
+        missing = set()
+        for key in keys:
+            state = self._states.get(key[0], {}).get(key[1])
+            if state is None:
+                missing.add(key)
+            else:
+                states[key] = state
+        if missing:
+            stmt = select(UserProgress).where(
+                tuple_(UserProgress.user_id, UserProgress.word_id).in_(missing)
+            )
+            rows = {(p.user_id, p.word_id): p for p in (await db.exec(stmt)).all()}
+            for key in missing:
+                p = rows.get(key)
+                states[key] = ProgressState() if p is None else ProgressState(
+                    mastery_count=p.mastery_count,
+                    is_mastered=p.is_mastered,
+                    last_reviewed=p.last_reviewed,
+                    next_due=p.next_due,
+                    last_seq=p.last_seq,
+                    base_mastery=p.mastery_count
+                )
+        return states
+
+    async def flush(self) -> int:
+        """Write every dirty row in one transaction; returns the number written"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            keys, self._dirty = self._dirty, set()
+            snapshot = {
+                key: (self._states[key[0]][key[1]].version, self._states[key[0]][key[1]].row(key))
+                for key in keys
+            }
+            # Answers from now on go to a segment this flush does not cover
+            covered = self._segment
+            self._segment += 1
+            self._open_segment()
+            try:
+                async with async_session_maker() as db:
+                    await self._write(db, [row for _, row in snapshot.values()])
+                    await db.commit()
+            except BaseException:
+                # Retried by the next flush; the journal still has the rows
+                self._dirty |= keys
+                self.flush_errors += 1
+                raise
+
+            for number, path in self._segments():
+                if number <= covered:
+                    os.remove(path)
+            for key, (version, row) in snapshot.items():
+                words = self._states[key[0]]
+                state = words[key[1]]
+                state.base_mastery = row["mastery_count"]
+                if state.version == version and key not in self._dirty:
+                    del words[key[1]]
+                    if not words:
+                        del self._states[key[0]]
+            self.flushes += 1
+            self.flushed_rows += len(snapshot)
+            return len(snapshot)
+
+    async def _write(self, db: AsyncSession, rows: list[dict]):
+        """Upsert full progress rows and move the stats counters along"""
+        await word_catalog.ensure_loaded(db)
+        table = UserProgress.__table__
+        for start in range(0, len(rows), WRITE_CHUNK):
+            chunk = rows[start:start + WRITE_CHUNK]
+            # Counters move from what is stored, so replaying a row twice is harmless
+            keys = [(r["user_id"], r["word_id"]) for r in chunk]
+            stored = {
+                (user_id, word_id): mastery
+                for user_id, word_id, mastery in (await db.exec(
+                    select(UserProgress.user_id, UserProgress.word_id, UserProgress.mastery_count).where(
+                        tuple_(UserProgress.user_id, UserProgress.word_id).in_(keys)
+                    )
+                )).all()
+            }
+
+            insert = upsert(table).values(chunk)
+            insert = insert.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.word_id],
+                set_={
+                    name: insert.excluded[name]
+                    for name in ("mastery_count", "is_mastered", "last_reviewed", "next_due", "last_seq")
+                }
+            )
+            await db.execute(insert)
+
+            changes = {}
+            for r in chunk:
+                previous = stored.get((r["user_id"], r["word_id"]), 0)
+                changes.setdefault(r["user_id"], []).append((r["word_id"], previous, r["mastery_count"]))
+            for user_id, user_changes in changes.items():
+                await progress_stats.record_changes(db, user_id, user_changes)
+
+    async def _replay(self, segments: list[tuple[int, str]]) -> int:
+        """Write the last journaled state of every word in the given segments"""
+        rows = {}
+        for _, path in segments:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = _decode(line)
+                    except (ValueError, KeyError):
+                        # A torn final line from a crash mid-write
+                        logger.warning("Skipping unreadable journal line", extra={"path": path})
+                        continue
+                    rows[(row["user_id"], row["word_id"])] = row
+        if rows:
+            async with async_session_maker() as db:
+                await self._write(db, list(rows.values()))
+                await db.commit()
+        return len(rows)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Progress flush failed", exc_info=e)
+
+    def _segments(self) -> list[tuple[int, str]]:
+        """(number, path) of the journal segments on disk, oldest first"""
+        segments = []
+        for path in glob.glob(f"{glob.escape(self.journal_path)}.*"):
+            suffix = path.rsplit(".", 1)[1]
+            if suffix.isdigit():
+                segments.append((int(suffix), path))
+        return sorted(segments)
+
+    def _open_segment(self):
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(f"{self.journal_path}.{self._segment:08d}", "a", encoding="utf-8")
+
+    def _lock_journal(self):
+        if fcntl is None:
+            return
+        self._lock_file = open(f"{self.journal_path}.lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(
+                f"{self.journal_path} is used by another process; "
+                "PROGRESS_BUFFER_ENABLED needs a single worker"
+            )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": PROGRESS_BUFFER_ENABLED,
+            "dirty": len(self._dirty),
+            "buffered_users": len(self._states),
+            "applied": self.applied,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors,
+            "replayed": self.replayed
+        }
+
+    async def aclose(self):
+        """Stop the flusher and drain the buffer (shutdown)"""
+        if self._flusher is None:
+            return
+        self._flusher.cancel()
+        await asyncio.gather(self._flusher, return_exceptions=True)
+        self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            # The journal keeps the rows; the next start replays them
+            logger.error("Progress flush on shutdown failed", exc_info=e)
+        self._journal.close()
+        self._journal = None
+        if not self._dirty:
+            for _, path in self._segments():
+                os.remove(path)
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+# Shared instance for the whole process
+progress_buffer = ProgressBuffer()
@@ -0,0 +1,169 @@
+"""
+Voca 语刻 - Progress Statistics
+Mastered / in-progress counters per user, overall and by level
+"""
+
+import os
+from collections import defaultdict
+from typing import Callable
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import upsert
+from models import UserProgress, UserStats, WordLevel
+from services.word_catalog import ALL_LEVELS, word_catalog
+
+# Keep per-user counters in the userstats table instead of aggregating on read
+USER_STATS_ENABLED = os.getenv("USER_STATS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+Counts = dict[str, dict[str, int]]  # level -> {"mastered": n, "in_progress": n}
+
+
+def mastery_bucket(mastery_count: int):
+    """Which counter a mastery level belongs to (None for unseen/new)"""
+    if mastery_count >= 3:
+        return "mastered"
+    if mastery_count > 0:
+        return "in_progress"
+    return None
+
+
+def _empty_counts() -> Counts:
+    return defaultdict(lambda: {"mastered": 0, "in_progress": 0})
+
+
+async def aggregate_counts(db: AsyncSession, user_id: str) -> Counts:
+    """Compute a user's counters with GROUP BY queries"""
+    counts = _empty_counts()
+
+    overall = select(UserProgress.mastery_count, func.count()).where(
+        UserProgress.user_id == user_id,
+        UserProgress.mastery_count > 0
+    ).group_by(UserProgress.mastery_count)
+    for mastery_count, n in (await db.exec(overall)).all():
+        counts[ALL_LEVELS][mastery_bucket(mastery_count)] += n
+
+    by_level = select(WordLevel.level, UserProgress.mastery_count, func.count()).join(
+        WordLevel, WordLevel.word_id == UserProgress.word_id
+    ).where(
+        UserProgress.user_id == user_id,
+        UserProgress.mastery_count > 0
+    ).group_by(WordLevel.level, UserProgress.mastery_count)
+    for level, mastery_count, n in (await db.exec(by_level)).all():
+        counts[level][mastery_bucket(mastery_count)] += n
+
+    return counts
+
+
+def change_deltas(
+    changes: list[tuple[int, int, int]], levels_of: Callable[[int], tuple[str, ...]] = word_catalog.levels_of
+) -> Counts:
+    """Counter deltas of (word_id, old_mastery, new_mastery) changes, by level"""
+    deltas = _empty_counts()
+    for word_id, old_mastery, new_mastery in changes:
+        old_bucket, new_bucket = mastery_bucket(old_mastery), mastery_bucket(new_mastery)
+        if old_bucket == new_bucket:
+            continue
+        for level in (ALL_LEVELS,) + levels_of(word_id):
+            if old_bucket:
+                deltas[level][old_bucket] -= 1
+            if new_bucket:
+                deltas[level][new_bucket] += 1
+    return deltas
+
+
+def apply_changes(counts: Counts, changes: list[tuple[int, int, int]]) -> Counts:
+    """Counters with changes not yet written to the database added on top"""
+    for level, buckets in change_deltas(changes).items():
+        for bucket, delta in buckets.items():
+            counts[level][bucket] += delta
+    return counts
+
+
+async def _seed_counts(db: AsyncSession, user_id: str) -> Counts:
+    """
+    Build a user's counters from the progress table, unless another
+    transaction created them first (the caller commits)
+    """
+    counts = await aggregate_counts(db, user_id)
+    # The overall row must exist even for users without any progress
+    levels = {ALL_LEVELS: counts[ALL_LEVELS], **counts}
+    await db.execute(upsert(UserStats.__table__).values([
+        {"user_id": user_id, "level": level, **buckets}
+        for level, buckets in levels.items()
+    ]).on_conflict_do_nothing())
+    return counts
+
+
+def reset_counts():
+    """
+    DELETE of every user's counters, so they are rebuilt from the progress
+    table on the next read (after imports change the levels of words)
+    """
+    return delete(UserStats.__table__)
+
+
+async def load_counts(db: AsyncSession, user_id: str) -> Counts:
+    """A user's counters, from userstats when enabled (built on first read)"""
+    if not USER_STATS_ENABLED:
+        return await aggregate_counts(db, user_id)
+
+    rows = (await db.exec(select(UserStats).where(UserStats.user_id == user_id))).all()
+    if not rows:
+        counts = await _seed_counts(db, user_id)
+        await db.commit()
+        return counts
+
+    counts = _empty_counts()
+    for row in rows:
+        counts[row.level] = {"mastered": row.mastered, "in_progress": row.in_progress}
+    return counts
+
+
+async def record_changes(db: AsyncSession, user_id: str, changes: list[tuple[int, int, int]]):
+    """
+    Apply (word_id, old_mastery, new_mastery) changes to the user's counters
+
+    Call after writing the progress rows, in the same transaction. A user
+    without counters gets them built here, from a progress table that
+    already includes these changes, so a first read racing this write
+    cannot leave them out.
+    """
+    if not USER_STATS_ENABLED:
+        return
+
+    exists = select(UserStats.user_id).where(
+        UserStats.user_id == user_id,
+        UserStats.level == ALL_LEVELS
+    )
+    if (await db.exec(exists)).first() is None:
+        await _seed_counts(db, user_id)
+        return
+
+    # Words added since the loaded catalog version (it reloads in the background)
+    added = [word_id for word_id, _, _ in changes if not word_catalog.has_word(word_id)]
+    added_levels: dict[int, tuple[str, ...]] = {}
+    if added:
+        rows = await db.exec(select(WordLevel.word_id, WordLevel.level).where(WordLevel.word_id.in_(added)))
+        for word_id, level in rows.all():
+            added_levels[word_id] = added_levels.get(word_id, ()) + (level,)
+
+    deltas = change_deltas(changes, lambda word_id: added_levels.get(word_id) or word_catalog.levels_of(word_id))
+    if not deltas:
+        return
+
+    table = UserStats.__table__
+    insert = upsert(table).values([
+        {"user_id": user_id, "level": level, **buckets}
+        for level, buckets in deltas.items()
+    ])
+    insert = insert.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.level],
+        set_={
+            "mastered": table.c.mastered + insert.excluded.mastered,
+            "in_progress": table.c.in_progress + insert.excluded.in_progress,
+        }
+    )
+    await db.execute(insert)
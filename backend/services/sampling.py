@@ -0,0 +1,74 @@
+"""
+Voca 语刻 - Weighted Sampling
+Alias tables (Vose's method) for drawing words in proportion to how common
+they are: O(n) to build once per catalog version, O(1) per draw
+"""
+
+import os
+import random
+from array import array
+from typing import Optional, Sequence
+
+# Word weight = 1 + COLLINS_WEIGHT * stars^2 + OXFORD_WEIGHT * (Oxford 3000),
+# so a five-star Oxford word is drawn ~30x as often as an unrated entry
+SAMPLING_COLLINS_WEIGHT = float(os.getenv("SAMPLING_COLLINS_WEIGHT", "1.0"))
+SAMPLING_OXFORD_WEIGHT = float(os.getenv("SAMPLING_OXFORD_WEIGHT", "4.0"))
+
+# Draws per requested word before a weighted sample gives up on duplicates
+# (callers top up from elsewhere)
+MAX_DRAWS_PER_WORD = 8
+
+
+def word_weight(collins: Optional[int], oxford: Optional[int]) -> float:
+    """Sampling weight of a word from its Collins stars (0-5) and Oxford 3000 flag"""
+    stars = min(max(collins or 0, 0), 5)
+    return 1.0 + SAMPLING_COLLINS_WEIGHT * stars * stars + SAMPLING_OXFORD_WEIGHT * (1 if oxford else 0)
+
+
+def build_alias(weights: Sequence[float]) -> tuple[array, array]:
+    """
+    Alias table of a weight list: (prob f32[n], alias u32[n]).
+
+    Draw i uniformly, keep it with probability prob[i], else take alias[i].
+    """
+    n = len(weights)
+    prob = array("f", bytes(4 * n))
+    alias = array("I", range(n))
+    if n == 0:
+        return prob, alias
+    total = float(sum(weights))
+    scaled = [w * n / total for w in weights] if total > 0 else [1.0] * n
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    # Leftovers are 1 up to rounding
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+def sample_alias(
+    ids: Sequence[int], prob: Sequence[float], alias: Sequence[int], count: int
+) -> list[int]:
+    """Up to `count` distinct ids drawn by weight, in O(count) expected draws"""
+    n = len(ids)
+    if n == 0 or count <= 0:
+        return []
+    picked: dict[int, None] = {}  # insertion-ordered set
+    rand = random.random
+    for _ in range(count * MAX_DRAWS_PER_WORD):
+        i = int(rand() * n)
+        if rand() >= prob[i]:
+            i = alias[i]
+        word_id = ids[i]
+        if word_id in picked:
+            continue
+        picked[word_id] = None
+        if len(picked) >= count:
+            break
+    return list(picked)
@@ -0,0 +1,29 @@
+"""
+Voca 语刻 - Review Scheduler
+Spaced-repetition due dates for the 3次刻印 mastery system
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+
+def _minutes(name: str, default: str) -> list[timedelta]:
+    return [timedelta(minutes=float(m)) for m in os.getenv(name, default).split(",")]
+
+
+# Delay until the next review after a correct answer, indexed by the new
+# mastery_count (0 -> 10 min, 1 -> 1 day, 2 -> 3 days)
+REVIEW_INTERVALS = _minutes("REVIEW_INTERVALS_MINUTES", "10,1440,4320")
+
+# Delay after a wrong answer, whatever the mastery level
+RETRY_INTERVAL = _minutes("RETRY_INTERVAL_MINUTES", "10")[0]
+
+
+def next_due(mastery_count: int, correct: bool, now: datetime) -> Optional[datetime]:
+    """When a word should be reviewed next; None once it is mastered"""
+    if mastery_count >= 3:
+        return None
+    if not correct:
+        return now + RETRY_INTERVAL
+    return now + REVIEW_INTERVALS[min(mastery_count, len(REVIEW_INTERVALS) - 1)]
@@ -0,0 +1,235 @@
+"""
+Voca 语刻 - Session Prefetch
+Keeps the next few sessions built ahead of time for active users, so the
+"next session" request is served from memory
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+
+from database import async_session_maker, read_session_maker
+from models import PrefetchedSession, WordResponse
+from services.sessions import build_session
+
+logger = logging.getLogger(__name__)
+
+SESSION_PREFETCH_ENABLED = os.getenv("SESSION_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+SESSION_PREFETCH_DEPTH = int(os.getenv("SESSION_PREFETCH_DEPTH", "2"))  # sessions kept ready per queue
+SESSION_PREFETCH_QUEUES = int(os.getenv("SESSION_PREFETCH_QUEUES", "1000"))  # active (user, level, count) queues
+SESSION_PREFETCH_TTL = float(os.getenv("SESSION_PREFETCH_TTL", "900"))  # seconds before a session is stale
+SESSION_PREFETCH_CONCURRENCY = int(os.getenv("SESSION_PREFETCH_CONCURRENCY", "4"))
+# Move evicted queues to the prefetchedsession table instead of dropping them
+SESSION_PREFETCH_SPILL = os.getenv("SESSION_PREFETCH_SPILL", "false").lower() in ("1", "true", "yes")
+
+QueueKey = tuple[str, str, int]  # (user_id, level, count)
+
+
+class PrefetchQueue:
+    """Ready sessions for one (user, level, count), oldest first"""
+
+    def __init__(self):
+        self.sessions: deque[tuple[float, list[WordResponse]]] = deque()
+        self.last_served: frozenset[int] = frozenset()
+        self.generation = 0  # bumped when queued sessions go stale
+
+    def word_ids(self) -> frozenset[int]:
+        """Words already handed out or queued, which new sessions avoid"""
+        queued = {w.id for _, words in self.sessions for w in words}
+        return self.last_served.union(queued)
+
+
+class SessionPrefetcher:
+    """
+    Per-user queues of prebuilt sessions, refilled by background tasks.
+
+    Queues live in an LRU bounded by SESSION_PREFETCH_QUEUES; with
+    SESSION_PREFETCH_SPILL, evicted queues are written to the
+    prefetchedsession table and read back on the next miss.
+    """
+
+    def __init__(
+        self,
+        depth: int = SESSION_PREFETCH_DEPTH,
+        max_queues: int = SESSION_PREFETCH_QUEUES,
+        ttl: float = SESSION_PREFETCH_TTL,
+        spill: bool = SESSION_PREFETCH_SPILL
+    ):
+        self.depth = depth
+        self.max_queues = max_queues
+        self.ttl = ttl
+        self.spill = spill
+        self._queues: OrderedDict[QueueKey, PrefetchQueue] = OrderedDict()
+        self._refilling: dict[QueueKey, asyncio.Task] = {}
+        self._tasks: set[asyncio.Task] = set()  # strong refs to running tasks
+        self._semaphore = asyncio.Semaphore(SESSION_PREFETCH_CONCURRENCY)
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.built = 0
+        self.spilled = 0
+
+    def _queue(self, key: QueueKey) -> PrefetchQueue:
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = PrefetchQueue()
+        self._queues.move_to_end(key)
+        while len(self._queues) > self.max_queues:
+            evicted_key, evicted = self._queues.popitem(last=False)
+            if self.spill and evicted.sessions:
+                self._start(self._spill(evicted_key, list(evicted.sessions)))
+        return queue
+
+    def _fresh(self, queue: PrefetchQueue) -> Optional[list[WordResponse]]:
+        now = time.time()
+        while queue.sessions:
+            created, words = queue.sessions.popleft()
+            if now - created <= self.ttl:
+                return words
+        return None
+
+    async def take(self, user_id: str, level: str, count: int) -> Optional[list[WordResponse]]:
+        """A prebuilt session, or None when the caller has to build one"""
+        key = (user_id, level, count)
+        queue = self._queue(key)
+        words = self._fresh(queue)
+        if words is not None:
+            self.hits += 1
+        elif self.spill:
+            words = await self._unspill(key)
+            if words is not None:
+                self.spill_hits += 1
+        if words is None:
+            self.misses += 1
+        return words
+
+    def served(self, user_id: str, level: str, count: int, words: list[WordResponse]):
+        """Record the session just returned, then top the queue back up"""
+        key = (user_id, level, count)
+        self._queue(key).last_served = frozenset(w.id for w in words)
+        self.refill(key)
+
+    def refill(self, key: QueueKey):
+        """Build sessions for a queue in the background until it is full"""
+        if key in self._refilling:
+            return
+        self._refilling[key] = self._start(self._refill(key))
+        self._refilling[key].add_done_callback(lambda t: self._refilling.pop(key, None))
+
+    def refill_user(self, user_id: str):
+        """
+        Rebuild every active queue of a user (after they answered words):
+        queued sessions were picked from the old due dates and mastery
+        """
+        for key in [k for k in self._queues if k[0] == user_id]:
+            queue = self._queues[key]
+            queue.sessions.clear()
+            queue.generation += 1  # a session being built now is dropped
+            self.refill(key)
+        if self.spill:
+            self._start(self._drop_spilled(user_id))
+
+    async def _refill(self, key: QueueKey):
+        user_id, level, count = key
+        while True:
+            queue = self._queues.get(key)
+            if queue is None or len(queue.sessions) >= self.depth:
+                return
+            generation = queue.generation
+            async with self._semaphore:
+                async with read_session_maker() as db:
+                    words = await build_session(db, user_id, level, count, exclude=queue.word_ids())
+            if not words:
+                return
+            if queue.generation != generation:
+                continue
+            queue.sessions.append((time.time(), words))
+            self.built += 1
+
+    def _start(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._finish)
+        return task
+
+    def _finish(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task failed", exc_info=task.exception())
+
+    async def _spill(self, key: QueueKey, sessions: list[tuple[float, list[WordResponse]]]):
+        user_id, level, count = key
+        async with async_session_maker() as db:
+            for created, words in sessions:
+                db.add(PrefetchedSession(
+                    user_id=user_id, level=level, count=count,
+                    payload=json.dumps([w.model_dump(exclude_unset=True) for w in words], ensure_ascii=False),
+                    created_at=datetime.utcfromtimestamp(created)
+                ))
+            await db.commit()
+        self.spilled += len(sessions)
+
+    async def _drop_spilled(self, user_id: str):
+        table = PrefetchedSession.__table__
+        async with async_session_maker() as db:
+            await db.execute(delete(table).where(table.c.user_id == user_id))
+            await db.commit()
+
+    async def _unspill(self, key: QueueKey) -> Optional[list[WordResponse]]:
+        """Pop the oldest spilled session of a queue, skipping stale ones"""
+        user_id, level, count = key
+        table = PrefetchedSession.__table__
+        oldest = select(func.min(table.c.id)).where(
+            table.c.user_id == user_id, table.c.level == level, table.c["count"] == count
+        ).scalar_subquery()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        async with async_session_maker() as db:
+            while True:
+                row = (await db.execute(
+                    delete(table).where(table.c.id == oldest).returning(table.c.payload, table.c.created_at)
+                )).first()
+                await db.commit()
+                if row is None:
+                    return None
+                if row.created_at >= cutoff:
+                    return [WordResponse(**w) for w in json.loads(row.payload)]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.spill_hits + self.misses
+        return {
+            "enabled": SESSION_PREFETCH_ENABLED,
+            "hits": self.hits,
+            "spill_hits": self.spill_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.spill_hits) / lookups if lookups else 0.0,
+            "built": self.built,
+            "spilled": self.spilled,
+            "queues": len(self._queues),
+            "ready_sessions": sum(len(q.sessions) for q in self._queues.values()),
+            "refilling": len(self._refilling),
+            "depth": self.depth
+        }
+
+    async def aclose(self):
+        """Stop refills; with spilling on, keep ready sessions for the next start"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.spill:
+            for key, queue in self._queues.items():
+                if queue.sessions:
+                    await self._spill(key, list(queue.sessions))
+        self._queues.clear()
+
+
+# Shared instance for the whole process
+session_prefetch = SessionPrefetcher()
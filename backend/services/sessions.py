@@ -0,0 +1,274 @@
+"""
+Voca 语刻 - Session Builder
+Picks the words for a learning session: due reviews first, new words from
+the catalog for the rest, each with multiple-choice options
+"""
+
+import logging
+import math
+import os
+import random
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import UserProgress, Word, WordLevel, WordResponse
+from services.distractors import distractor_candidates, load_pool, pick_from_pool
+from services.progress_buffer import progress_buffer
+from services.word_catalog import ALL_LEVELS, word_catalog
+
+logger = logging.getLogger(__name__)
+
+# Share of a session that due reviews may take when new words are available
+SESSION_REVIEW_SHARE = float(os.getenv("SESSION_REVIEW_SHARE", "0.5"))
+
+# Rejection-sampling rounds when looking for words the user has never seen
+NEW_WORD_ROUNDS = 3
+
+# How new words are drawn: "uniform" over the level, or "weighted" towards
+# common words (Collins stars, Oxford 3000) with alias tables
+SESSION_STRATEGIES = ("uniform", "weighted")
+SESSION_STRATEGY = os.getenv("SESSION_STRATEGY", "uniform")
+
+# Weighted strategy, once every word of a level has been seen: chance of
+# repeating a word by the user's mastery of it
+MASTERY_WEIGHTS = {0: 1.0, 1: 0.6, 2: 0.3, 3: 0.1}
+
+# Fields every card carries, and the extra ones in compact mode
+REQUIRED_FIELDS = ("id", "text", "definition")
+COMPACT_FIELDS = ("phonetic", "options")
+
+# Optional WordResponse fields read straight from Word columns
+WORD_COLUMNS = ("phonetic", "phonetic_us", "phonetic_uk", "definition_json", "exam_meta")
+
+
+async def due_word_ids(
+    db: AsyncSession, user_id: str, level: str, count: int, now: datetime,
+    exclude: frozenset[int] = frozenset()
+) -> list[int]:
+    """
+    Words whose review is due, oldest first (range scan on user_id, next_due)
+
+    Unflushed progress from the write-behind buffer overrides stored rows.
+    """
+    buffered = progress_buffer.user_states(user_id)
+    stmt = select(UserProgress.word_id, UserProgress.next_due).where(
+        UserProgress.user_id == user_id,
+        UserProgress.next_due <= now
+    )
+    if level != ALL_LEVELS:
+        # Primary-key probe into wordlevel for each due row
+        stmt = stmt.join(WordLevel, (WordLevel.word_id == UserProgress.word_id) & (WordLevel.level == level))
+    stmt = stmt.order_by(UserProgress.next_due).limit(count + len(exclude) + len(buffered))
+    due = [(next_due, i) for i, next_due in (await db.exec(stmt)).all() if i not in buffered]
+    if buffered:
+        due.extend(
+            (state.next_due, i) for i, state in buffered.items()
+            if state.next_due is not None and state.next_due <= now
+            and (level == ALL_LEVELS or level in word_catalog.levels_of(i))
+        )
+        due.sort()
+    return [i for _, i in due if i not in exclude][:count]
+
+
+def parse_strategy(strategy: Optional[str]) -> str:
+    """Sampling strategy for ?strategy= (None = SESSION_STRATEGY)"""
+    strategy = strategy or SESSION_STRATEGY
+    if strategy not in SESSION_STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy} (use {', '.join(SESSION_STRATEGIES)})")
+    return strategy
+
+
+def draw(level: str, count: int, strategy: str) -> list[int]:
+    """Up to `count` distinct catalog words of a level, by strategy"""
+    if strategy == "weighted":
+        return word_catalog.sample_weighted(level, count)
+    return word_catalog.sample(level, count)
+
+
+async def mastery_of(db: AsyncSession, user_id: str, word_ids: list[int]) -> dict[int, int]:
+    """The user's mastery of the given words (unseen words are left out)"""
+    buffered = progress_buffer.user_states(user_id)
+    mastery = dict((await db.exec(
+        select(UserProgress.word_id, UserProgress.mastery_count).where(
+            UserProgress.user_id == user_id,
+            UserProgress.word_id.in_([i for i in word_ids if i not in buffered])
+        )
+    )).all())
+    mastery.update((i, buffered[i].mastery_count) for i in word_ids if i in buffered)
+    return mastery
+
+
+async def new_word_ids(
+    db: AsyncSession, user_id: str, level: str, count: int, exclude: set[int],
+    strategy: str = "uniform"
+) -> list[int]:
+    """Catalog words the user has never answered"""
+    buffered = progress_buffer.user_states(user_id)
+    picked: list[int] = []
+    for round_ in range(NEW_WORD_ROUNDS):
+        need = count - len(picked)
+        if need <= 0:
+            break
+        taken = exclude.union(picked)
+        # Common words may all be seen: the last round also reaches rare ones
+        round_strategy = strategy if round_ < NEW_WORD_ROUNDS - 1 else "uniform"
+        candidates = [i for i in draw(level, need * 2, round_strategy) if i not in taken and i not in buffered]
+        if not candidates:
+            continue
+        seen = set((await db.exec(
+            select(UserProgress.word_id).where(
+                UserProgress.user_id == user_id,
+                UserProgress.word_id.in_(candidates)
+            )
+        )).all())
+        picked.extend(i for i in candidates if i not in seen)
+    return picked[:count]
+
+
+async def repeat_word_ids(
+    db: AsyncSession, user_id: str, level: str, count: int, strategy: str
+) -> list[int]:
+    """
+    Seen words to repeat when a level has no new words left; the weighted
+    strategy prefers common words the user knows least (accept/reject by
+    MASTERY_WEIGHTS)
+    """
+    if strategy != "weighted":
+        return word_catalog.sample(level, count)
+    candidates = word_catalog.sample_weighted(level, count * 2)
+    mastery = await mastery_of(db, user_id, candidates)
+    accepted, rejected = [], []
+    for i in candidates:
+        keep = random.random() < MASTERY_WEIGHTS.get(mastery.get(i, 0), 1.0)
+        (accepted if keep else rejected).append(i)
+    return (accepted + rejected)[:count]
+
+
+async def pick_word_ids(
+    db: AsyncSession, user_id: str, level: str, count: int,
+    exclude: frozenset[int] = frozenset(), strategy: str = SESSION_STRATEGY
+) -> list[int]:
+    """Mix due reviews and new words into one session, avoiding `exclude` where possible"""
+    await word_catalog.ensure_loaded(db)
+    now = datetime.utcnow()
+
+    due = await due_word_ids(db, user_id, level, count, now, exclude)
+    review_slots = min(len(due), math.ceil(count * SESSION_REVIEW_SHARE))
+    new = await new_word_ids(db, user_id, level, count - review_slots, exclude.union(due), strategy)
+
+    # Reviews take back any slots new words could not fill
+    picked = due[:count - len(new)] + new
+    if len(picked) < count:
+        # Everything in the level has been seen: repeat words the user knows
+        taken = set(picked)
+        extra = await repeat_word_ids(db, user_id, level, count + len(taken) + len(exclude), strategy)
+        extra = [i for i in extra if i not in taken]
+        extra.sort(key=lambda i: i in exclude)
+        picked.extend(extra)
+        picked = picked[:count]
+
+    random.shuffle(picked)
+    return picked
+
+
+def project_fields(words: list[WordResponse], fields: Optional[set[str]]) -> list[WordResponse]:
+    """Copies of full WordResponses with only `fields` set (None = unchanged)"""
+    if fields is None:
+        return words
+    return [WordResponse(**{name: getattr(w, name) for name in fields}) for w in words]
+
+
+def parse_fields(fields: Optional[str], compact: bool = False) -> Optional[set[str]]:
+    """
+    WordResponse fields to return for ?fields= / ?compact=true (None = all)
+
+    id, text and definition are always included: the client grades answers
+    against the definition.
+    """
+    if fields:
+        requested = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = requested - set(WordResponse.model_fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return requested | set(REQUIRED_FIELDS)
+    if compact:
+        return set(REQUIRED_FIELDS + COMPACT_FIELDS)
+    return None
+
+
+async def build_session(
+    db: AsyncSession, user_id: str, level: str, count: int,
+    fields: Optional[set[str]] = None, exclude: frozenset[int] = frozenset(),
+    strategy: str = SESSION_STRATEGY
+) -> list[WordResponse]:
+    """
+    Hydrate a session's words and attach shuffled definition options
+
+    With `fields`, only those columns are read and only those fields are set
+    on each WordResponse (serialize with exclude_unset). Words in `exclude`
+    are only used when nothing else is left.
+    """
+    selected_ids = await pick_word_ids(db, user_id, level, count, exclude, strategy)
+    if not selected_ids:
+        return []
+
+    wanted_fields = set(WordResponse.model_fields) if fields is None else fields
+    columns = [Word.id, Word.text, Word.definition, Word.options] + [
+        getattr(Word, name) for name in WORD_COLUMNS if name in wanted_fields
+    ]
+    words = (await db.exec(select(*columns).where(Word.id.in_(selected_ids)))).all()
+    words_by_id = {w.id: w for w in words}
+    selected = [words_by_id[i] for i in selected_ids if i in words_by_id]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Selected words", extra={"words": [w.text for w in selected]})
+
+    options_by_id = session_options(level, selected) if "options" in wanted_fields else {}
+
+    result = []
+    for word in selected:
+        values = {"id": word.id, "text": word.text, "definition": word.definition}
+        for name in WORD_COLUMNS:
+            if name in wanted_fields:
+                values[name] = getattr(word, name)
+        if "options" in wanted_fields:
+            values["options"] = options_by_id[word.id]
+        result.append(WordResponse(**values))
+
+    return result
+
+
+def session_options(level: str, words) -> dict[int, list[str]]:
+    """Shuffled answer options (definition + 3 distractors) for each word"""
+    # Precomputed pools in Word.options cover most words; the rest draw
+    # distractors of the same level and part of speech from the catalog
+    pooled = {}
+    fallback_ids = {}
+    for word in words:
+        distractors = pick_from_pool(load_pool(word.options), word.definition)
+        if len(distractors) >= 3:
+            pooled[word.id] = distractors
+        else:
+            pos = word_catalog.pos_of(word.id)
+            fallback_ids[word.id] = distractor_candidates(word_catalog, level, pos, word.id, 3)
+    # Definitions come from the catalog snapshot, so this needs no query
+    fallback_defs = {}
+    for ids in fallback_ids.values():
+        for i in ids:
+            definition = word_catalog.definition_of(i)
+            if definition:
+                fallback_defs[i] = definition
+
+    options_by_id = {}
+    for word in words:
+        if word.id in pooled:
+            distractors = pooled[word.id]
+        else:
+            distractors = [fallback_defs[i] for i in fallback_ids[word.id] if i in fallback_defs]
+        options = [word.definition] + distractors
+        random.shuffle(options)
+        options_by_id[word.id] = options
+    return options_by_id
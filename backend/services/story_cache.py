@@ -0,0 +1,103 @@
+"""
+Voca 语刻 - Story Cache
+Two-tier cache for generated stories: an in-process LRU in front of the
+AIStoryCache table
+"""
+
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import upsert
+from models import AIStoryCache
+
+STORY_CACHE_SIZE = int(os.getenv("STORY_CACHE_SIZE", "512"))
+STORY_CACHE_TTL = float(os.getenv("STORY_CACHE_TTL", "3600"))  # seconds in memory
+
+
+class StoryCache:
+    """
+    Stories keyed by generate_word_hash(word_ids, theme).
+
+    Entries are {"content": ..., "translation": ...}. The memory tier is
+    bounded by size and TTL; the table keeps every story indefinitely.
+    """
+
+    def __init__(self, max_size: int = STORY_CACHE_SIZE, ttl: float = STORY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, story: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, story)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def peek(self, key: str) -> Optional[dict]:
+        """Memory tier only, without touching the counters"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, story = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return story
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[dict]:
+        story = self.peek(key)
+        if story is not None:
+            self.memory_hits += 1
+            return story
+
+        row = (await db.exec(
+            select(AIStoryCache).where(AIStoryCache.word_ids_hash == key)
+        )).first()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.db_hits += 1
+        story = {"content": row.content, "translation": row.translation or ""}
+        self._remember(key, story)
+        return story
+
+    async def put(self, db: AsyncSession, key: str, theme: Optional[str], story: dict):
+        entry = {"content": story["content"], "translation": story["translation"]}
+        self._remember(key, entry)
+
+        insert = upsert(AIStoryCache.__table__).values(
+            word_ids_hash=key, theme=theme, created_at=datetime.utcnow(), **entry
+        )
+        insert = insert.on_conflict_do_update(
+            index_elements=["word_ids_hash"],
+            set_={"content": insert.excluded.content, "translation": insert.excluded.translation}
+        )
+        await db.execute(insert)
+        await db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl
+        }
+
+
+# Shared instance for the whole process
+story_cache = StoryCache()
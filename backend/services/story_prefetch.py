@@ -0,0 +1,192 @@
+"""
+Voca 语刻 - Story Prefetch
+Speculatively generates the story for a session's words while the user is
+still studying them, so the summary page finds it in the story cache
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Optional
+
+from database import async_session_maker
+from services.ai_service import generate_story_with_translation, generate_word_hash
+from services.story_cache import story_cache
+
+logger = logging.getLogger(__name__)
+
+STORY_PREFETCH_ENABLED = os.getenv("STORY_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+STORY_PREFETCH_CONCURRENCY = int(os.getenv("STORY_PREFETCH_CONCURRENCY", "2"))  # model calls at once
+STORY_PREFETCH_MAX_PENDING = int(os.getenv("STORY_PREFETCH_MAX_PENDING", "32"))  # running + waiting jobs
+STORY_PREFETCH_DAILY_CAP = int(os.getenv("STORY_PREFETCH_DAILY_CAP", "500"))  # speculative calls per day
+
+
+@dataclass
+class StoryJob:
+    """One speculative generation, shared by every session with the same words and theme"""
+    key: str
+    task: asyncio.Task
+    users: set[str] = field(default_factory=set)
+    claimed: bool = False  # a /api/story request is waiting on it; never cancel
+
+
+class StoryPrefetcher:
+    """
+    Background story generation for sessions that were just handed out.
+
+    Jobs are keyed like the story cache, so two users with the same words
+    share one call. A user's job is cancelled when they start another
+    session (or cancel explicitly) unless another user or a story request
+    still needs it. The daily cap counts model calls made by this process.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = STORY_PREFETCH_CONCURRENCY,
+        max_pending: int = STORY_PREFETCH_MAX_PENDING,
+        daily_cap: int = STORY_PREFETCH_DAILY_CAP
+    ):
+        self.max_pending = max_pending
+        self.daily_cap = daily_cap
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._jobs: dict[str, StoryJob] = {}
+        self._user_jobs: dict[str, str] = {}  # user_id -> key of their current job
+        self._day = date.today()
+        self.calls_today = 0
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.skipped = {"cached": 0, "busy": 0, "daily_cap": 0}
+        self.generated = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.claimed = 0
+
+    def schedule(self, user_id: str, words: list[dict], theme: Optional[str]):
+        """
+        Start generating the story for a session's words (dicts with id, text
+        and definition), replacing the user's previous speculative job
+        """
+        key = generate_word_hash([w["id"] for w in words], theme)
+        previous = self._user_jobs.get(user_id)
+        if previous != key:
+            self.cancel(user_id)
+
+        job = self._jobs.get(key)
+        if job is not None:
+            job.users.add(user_id)
+            self._user_jobs[user_id] = key
+            self.deduplicated += 1
+            return
+        if story_cache.peek(key) is not None:
+            self.skipped["cached"] += 1
+            return
+        if len(self._jobs) >= self.max_pending:
+            self.skipped["busy"] += 1
+            return
+
+        task = asyncio.create_task(self._generate(key, words, theme))
+        self._jobs[key] = StoryJob(key=key, task=task, users={user_id})
+        self._user_jobs[user_id] = key
+        task.add_done_callback(lambda t: self._finish(key, t))
+        self.scheduled += 1
+
+    def cancel(self, user_id: str):
+        """The user left their session: drop their job if nobody else needs it"""
+        key = self._user_jobs.pop(user_id, None)
+        job = self._jobs.get(key) if key else None
+        if job is None:
+            return
+        job.users.discard(user_id)
+        if not job.users and not job.claimed:
+            job.task.cancel()
+
+    async def claim(self, key: str) -> Optional[dict]:
+        """
+        Wait for a speculative job that is generating `key`, for a story
+        request that would otherwise start the same model call.
+        None if there is no such job or it failed.
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            return None
+        job.claimed = True
+        self.claimed += 1
+        try:
+            # Shield: a disconnecting client must not cancel the shared job
+            return await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            if job.task.cancelled():
+                return None
+            raise
+        except Exception:
+            return None
+
+    def _take_daily_slot(self) -> bool:
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self.calls_today = 0
+        if self.calls_today >= self.daily_cap:
+            return False
+        self.calls_today += 1
+        return True
+
+    async def _generate(self, key: str, words: list[dict], theme: Optional[str]) -> Optional[dict]:
+        async with self._semaphore:
+            # The user may have asked for the story while this job waited
+            async with async_session_maker() as db:
+                story = await story_cache.get(db, key)
+            if story is not None:
+                return story
+            if not self._take_daily_slot():
+                self.skipped["daily_cap"] += 1
+                return None
+            word_data = [{"text": w["text"], "definition": w["definition"]} for w in words]
+            story = await generate_story_with_translation(word_data, theme)
+        if story.get("fallback"):
+            self.failed += 1
+            return None
+        async with async_session_maker() as db:
+            await story_cache.put(db, key, theme, story)
+        self.generated += 1
+        return story
+
+    def _finish(self, key: str, task: asyncio.Task):
+        job = self._jobs.pop(key, None)
+        if job is not None:
+            for user_id in job.users:
+                if self._user_jobs.get(user_id) == key:
+                    del self._user_jobs[user_id]
+        if task.cancelled():
+            self.cancelled += 1
+        elif task.exception() is not None:
+            self.failed += 1
+            logger.error("Story prefetch failed", exc_info=task.exception())
+
+    def stats(self) -> dict:
+        return {
+            "enabled": STORY_PREFETCH_ENABLED,
+            "scheduled": self.scheduled,
+            "deduplicated": self.deduplicated,
+            "skipped": dict(self.skipped),
+            "generated": self.generated,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "claimed": self.claimed,
+            "running": len(self._jobs),
+            "calls_today": self.calls_today,
+            "daily_cap": self.daily_cap
+        }
+
+    async def aclose(self):
+        """Cancel every job (shutdown)"""
+        tasks = [job.task for job in self._jobs.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Shared instance for the whole process
+story_prefetch = StoryPrefetcher()
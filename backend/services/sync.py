@@ -0,0 +1,193 @@
+"""
+Voca 语刻 - Delta Sync
+Monotonic change versions on words and progress, and the queries behind
+/api/sync that return only rows changed since a client's last version
+"""
+
+import json
+import logging
+import os
+from typing import Iterator, Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import UserProgress, Word
+
+logger = logging.getLogger(__name__)
+
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "5000"))  # rows per /api/sync response
+
+SYNC_CLOCK = "syncclock"
+VERSIONED_TABLES = ("word", "userprogress")
+
+# SQLite: one clock row, bumped by triggers. Writers are serialized, so
+# versions are handed out in commit order.
+SQLITE_CLOCK_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {SYNC_CLOCK} "
+    "(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)"
+)
+# WHEN guard: the trigger's own UPDATE of change_version must not bump again
+SQLITE_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS {table}_sync_{suffix} AFTER {event} ON {table} {when}BEGIN "
+    f"UPDATE {SYNC_CLOCK} SET version = version + 1 WHERE id = 1; "
+    "UPDATE {table} SET change_version = "
+    f"(SELECT version FROM {SYNC_CLOCK} WHERE id = 1) WHERE id = new.id; "
+    "END"
+)
+
+# PostgreSQL: a sequence stamped on by a BEFORE trigger. Versions follow
+# the order rows were written, not committed, so a client may miss a row
+# from a long transaction; re-sync from 0 to repair.
+POSTGRES_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS sync_version_seq",
+    "CREATE OR REPLACE FUNCTION sync_bump_version() RETURNS trigger AS $$ "
+    "BEGIN NEW.change_version := nextval('sync_version_seq'); RETURN NEW; END; "
+    "$$ LANGUAGE plpgsql",
+]
+
+# Word fields sent to clients (None values are left out of each line)
+WORD_SYNC_FIELDS = (
+    "text", "definition", "phonetic", "phonetic_us", "phonetic_uk",
+    "definition_json", "exam_meta", "level", "collins", "oxford", "exchange"
+)
+PROGRESS_SYNC_FIELDS = ("word_id", "mastery_count", "is_mastered", "last_reviewed", "next_due", "last_seq")
+
+# Only updates of what clients receive bump a row's version, so rewriting
+# e.g. Word.options (build_distractors) does not resend every word
+SYNC_COLUMNS = {"word": WORD_SYNC_FIELDS, "userprogress": PROGRESS_SYNC_FIELDS}
+
+
+def ensure_sync_versions(conn):
+    """
+    Create the version triggers. When a table's triggers were missing, rows
+    may have been written without a version, so those get fresh, distinct
+    versions first.
+    """
+    if conn.dialect.name == "sqlite":
+        _ensure_sqlite(conn)
+    elif conn.dialect.name == "postgresql":
+        _ensure_postgres(conn)
+
+
+def _update_of(table: str) -> str:
+    return f"UPDATE OF {', '.join(SYNC_COLUMNS[table])}"
+
+
+def _ensure_sqlite(conn):
+    conn.exec_driver_sql(SQLITE_CLOCK_DDL)
+    conn.exec_driver_sql(f"INSERT OR IGNORE INTO {SYNC_CLOCK} (id, version) VALUES (1, 0)")
+    existing = dict(conn.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?", ("%_sync_a_",)
+    ).all())
+    for table in VERSIONED_TABLES:
+        update_of = _update_of(table)
+        if f"{table}_sync_ai" in existing and update_of in existing.get(f"{table}_sync_au", ""):
+            continue
+        # clock + id is unique within the table and above every earlier version
+        max_id = conn.exec_driver_sql(
+            f"SELECT MAX(id) FROM {table} WHERE change_version = 0"
+        ).scalar()
+        if max_id is not None:
+            conn.exec_driver_sql(
+                f"UPDATE {table} SET change_version = "
+                f"(SELECT version FROM {SYNC_CLOCK} WHERE id = 1) + id WHERE change_version = 0"
+            )
+            conn.exec_driver_sql(f"UPDATE {SYNC_CLOCK} SET version = version + ? WHERE id = 1", (max_id,))
+        # Replaces an update trigger created for a different column list
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_sync_au")
+        conn.exec_driver_sql(SQLITE_TRIGGER.format(table=table, suffix="ai", event="INSERT", when=""))
+        conn.exec_driver_sql(SQLITE_TRIGGER.format(
+            table=table, suffix="au", event=update_of,
+            when="WHEN new.change_version IS old.change_version "
+        ))
+        logger.info("Created sync version triggers", extra={"table": table})
+
+
+def _ensure_postgres(conn):
+    for ddl in POSTGRES_DDL:
+        conn.exec_driver_sql(ddl)
+    for table in VERSIONED_TABLES:
+        update_of = _update_of(table)
+        definition = conn.exec_driver_sql(
+            f"SELECT pg_get_triggerdef(oid) FROM pg_trigger WHERE tgname = '{table}_sync_version'"
+        ).scalar()
+        if definition is not None and update_of in definition:
+            continue
+        if definition is None:
+            conn.exec_driver_sql(
+                f"UPDATE {table} SET change_version = nextval('sync_version_seq') WHERE change_version = 0"
+            )
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_sync_version ON {table}")
+        conn.exec_driver_sql(
+            f"CREATE TRIGGER {table}_sync_version BEFORE INSERT OR {update_of} ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION sync_bump_version()"
+        )
+        logger.info("Created sync version triggers", extra={"table": table})
+
+
+def _word_line(word) -> dict:
+    line = {"t": "word", "v": word.change_version, "id": word.id}
+    for name in WORD_SYNC_FIELDS:
+        value = getattr(word, name)
+        if value is not None:
+            line[name] = value
+    return line
+
+
+def _progress_line(progress) -> dict:
+    return {
+        "t": "progress",
+        "v": progress.change_version,
+        "word_id": progress.word_id,
+        "mastery_count": progress.mastery_count,
+        "is_mastered": progress.is_mastered,
+        "last_reviewed": progress.last_reviewed and progress.last_reviewed.isoformat(),
+        "next_due": progress.next_due and progress.next_due.isoformat(),
+        "last_seq": progress.last_seq,
+    }
+
+
+async def changes_since(
+    db: AsyncSession, since: int, user_id: Optional[str] = None, limit: int = SYNC_PAGE_SIZE
+) -> tuple[list[dict], int, bool]:
+    """
+    Up to `limit` changed rows in version order, the version to pass as
+    `since` next time, and whether more rows are waiting
+
+    Words come from the change_version index; progress from the user's
+    (user_id, change_version) index. Taking the first `limit` of the merged
+    lists never skips a row: whatever was cut off has a higher version.
+    """
+    word_columns = [getattr(Word, name) for name in ("id", "change_version") + WORD_SYNC_FIELDS]
+    words = (await db.exec(
+        select(*word_columns).where(Word.change_version > since)
+        .order_by(Word.change_version).limit(limit)
+    )).all()
+    lines = [_word_line(w) for w in words]
+    more = len(words) == limit
+
+    if user_id is not None:
+        progress = (await db.exec(
+            select(UserProgress).where(
+                UserProgress.user_id == user_id,
+                UserProgress.change_version > since
+            ).order_by(UserProgress.change_version).limit(limit)
+        )).all()
+        lines += [_progress_line(p) for p in progress]
+        more = more or len(progress) == limit
+        lines.sort(key=lambda line: line["v"])
+        if len(lines) > limit:
+            lines = lines[:limit]
+            more = True
+
+    version = lines[-1]["v"] if lines else since
+    return lines, version, more
+
+
+def ndjson(lines: list[dict], version: int, more: bool) -> Iterator[bytes]:
+    """One JSON object per line, ending with {"t": "end", ...}"""
+    for line in lines:
+        yield (json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+    end = {"t": "end", "version": version, "more": more, "count": len(lines)}
+    yield (json.dumps(end, separators=(",", ":")) + "\n").encode()
@@ -0,0 +1,207 @@
+"""
+Voca 语刻 - Batch Translation
+Resolves many looked-up words at once: known words and inflected forms from
+the database, the rest from the model in one structured request, with a
+negative cache so failures and non-words are not retried on every tap
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_session_maker, upsert
+from models import Word, WordLevel
+from services.lemma_index import lemma_index
+from services.llm_client import llm
+from services.word_catalog import word_catalog
+
+logger = logging.getLogger(__name__)
+
+TRANSLATE_BATCH_MAX = int(os.getenv("TRANSLATE_BATCH_MAX", "100"))  # words per request
+TRANSLATE_NEGATIVE_TTL = float(os.getenv("TRANSLATE_NEGATIVE_TTL", "86400"))  # seconds, non-words
+TRANSLATE_ERROR_TTL = float(os.getenv("TRANSLATE_ERROR_TTL", "60"))  # seconds, failed model calls
+TRANSLATE_NEGATIVE_SIZE = int(os.getenv("TRANSLATE_NEGATIVE_SIZE", "10000"))
+
+# Punctuation a tap on a reading passage may pick up around the word
+WORD_PUNCTUATION = " \t\r\n.,;:!?\"'()[]{}<>“”‘’«»…—–"
+MAX_WORD_LENGTH = 64
+HAS_LETTER = re.compile(r"[a-z]")
+
+BATCH_SYSTEM_PROMPT = (
+    "你是一个简洁的英语词典。对每个输入单词给出简短的中文释义。"
+    "只输出一个 JSON 对象：键是输入的单词（原样），值是中文释义；"
+    "如果输入不是英语单词（拼写错误、乱码等），值为 null。"
+)
+
+
+def normalize_word(word: str) -> str:
+    """Lower-cased word without surrounding whitespace and punctuation"""
+    return word.strip(WORD_PUNCTUATION).lower()
+
+
+def parse_definitions(content: str) -> dict:
+    """The JSON object in a model reply (tolerates code fences around it)"""
+    start, end = content.find("{"), content.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in the reply")
+    data = json.loads(content[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("reply is not a JSON object")
+    return {str(k).strip().lower(): v for k, v in data.items()}
+
+
+class NegativeCache:
+    """
+    Words that recently could not be translated, with why.
+
+    "not_found" entries (the model said it is not a word) live for
+    TRANSLATE_NEGATIVE_TTL; "error" entries (the call failed) for
+    TRANSLATE_ERROR_TTL, so an outage is retried soon after it ends.
+    """
+
+    def __init__(self, max_size: int = TRANSLATE_NEGATIVE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, str, str]] = OrderedDict()
+        self.hits = 0
+
+    def get(self, word: str) -> Optional[tuple[str, str]]:
+        """(source, detail) of a cached failure, or None"""
+        entry = self._entries.get(word)
+        if entry is None:
+            return None
+        expires_at, source, detail = entry
+        if expires_at < time.monotonic():
+            del self._entries[word]
+            return None
+        self.hits += 1
+        return source, detail
+
+    def put(self, word: str, source: str, detail: str):
+        ttl = TRANSLATE_NEGATIVE_TTL if source == "not_found" else TRANSLATE_ERROR_TTL
+        self._entries[word] = (time.monotonic() + ttl, source, detail)
+        self._entries.move_to_end(word)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits}
+
+
+# Shared instance for the whole process
+negative_cache = NegativeCache()
+
+
+def result(query: str, word: str, definition: Optional[str], source: str) -> dict:
+    return {"query": query, "word": word, "definition": definition, "source": source}
+
+
+async def resolve_known(db: AsyncSession, queries: list[str]) -> dict[str, dict]:
+    """Results for queries that are words or inflected forms in the database (one query)"""
+    await lemma_index.ensure_loaded(db)
+    candidates = {query: [query] + lemma_index.candidates(query) for query in queries}
+    texts = {text for texts in candidates.values() for text in texts}
+    rows = (await db.exec(select(Word.text, Word.definition).where(Word.text.in_(texts)))).all()
+    definitions = dict(rows)
+
+    found = {}
+    for query, texts in candidates.items():
+        # Exact match first, then headwords in lemma-index order
+        text = next((t for t in texts if t in definitions), None)
+        if text is not None:
+            found[query] = result(query, text, definitions[text], "database")
+    return found
+
+
+async def translate_unknown(words: list[str]) -> dict[str, dict]:
+    """Ask the model for every word in one request; failures go to the negative cache"""
+    try:
+        response = await llm.chat(
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": f"单词列表：{json.dumps(words, ensure_ascii=False)}"}
+            ],
+            temperature=0.3,
+            max_tokens=min(50 + 40 * len(words), 4000),
+            response_format={"type": "json_object"}
+        )
+        definitions = parse_definitions(response.choices[0].message.content or "")
+    except Exception as e:
+        logger.warning("Batch translate failed for %d words: %s", len(words), e)
+        for word in words:
+            negative_cache.put(word, "error", str(e))
+        return {word: result(word, word, None, "error") for word in words}
+
+    results = {}
+    for word in words:
+        definition = definitions.get(word)
+        if isinstance(definition, str) and definition.strip():
+            results[word] = result(word, word, definition.strip(), "ai")
+        elif word in definitions:
+            negative_cache.put(word, "not_found", "not an English word")
+            results[word] = result(word, word, None, "not_found")
+        else:
+            negative_cache.put(word, "error", "missing from the model reply")
+            results[word] = result(word, word, None, "error")
+    return results
+
+
+async def store_translations(definitions: dict[str, str]) -> int:
+    """Insert new AI words and their level rows in one transaction; returns rows added"""
+    if not definitions:
+        return 0
+    async with async_session_maker() as db:
+        insert = upsert(Word.__table__).values([
+            {"text": text, "definition": definition, "level": "AI"}
+            for text, definition in definitions.items()
+        ])
+        # A concurrent lookup may have stored some of them first
+        insert = insert.on_conflict_do_nothing(index_elements=["text"]).returning(Word.__table__.c.id)
+        word_ids = (await db.execute(insert)).scalars().all()
+        if word_ids:
+            await db.execute(upsert(WordLevel.__table__).values([
+                {"word_id": word_id, "level": "AI"} for word_id in word_ids
+            ]).on_conflict_do_nothing())
+        await db.commit()
+    if word_ids:
+        # Once per batch, not once per word
+        word_catalog.invalidate()
+        logger.info("Added AI translations", extra={"rows": len(word_ids)})
+    return len(word_ids)
+
+
+async def translate_batch(db: AsyncSession, words: list[str]) -> list[dict]:
+    """One result per distinct normalized word, in request order"""
+    queries = list(dict.fromkeys(w for w in map(normalize_word, words) if w))
+    results = {}
+    for query in queries:
+        if len(query) > MAX_WORD_LENGTH or not HAS_LETTER.search(query):
+            results[query] = result(query, query, None, "not_found")
+    pending = [q for q in queries if q not in results]
+    if pending:
+        results.update(await resolve_known(db, pending))
+
+    # Like the single lookup: the database first, then cached failures
+    unknown = []
+    for query in pending:
+        if query in results:
+            continue
+        cached = negative_cache.get(query)
+        if cached is not None:
+            results[query] = result(query, query, None, cached[0])
+        else:
+            unknown.append(query)
+    if unknown:
+        logger.debug("Batch translate misses, asking the model", extra={"words": unknown})
+        translated = await translate_unknown(unknown)
+        results.update(translated)
+        await store_translations({
+            word: r["definition"] for word, r in translated.items() if r["source"] == "ai"
+        })
+    return [results[query] for query in queries]
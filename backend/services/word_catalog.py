@@ -0,0 +1,250 @@
+"""
+Voca 语刻 - Word Catalog
+Process-wide, level-partitioned index of word ids used to build sessions
+"""
+
+import asyncio
+import logging
+import os
+import random
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Sequence
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_session_maker
+from models import Word, WordLevel
+from services.catalog_snapshot import ALL_LEVELS, CatalogSnapshot, build_snapshot, write_snapshot
+from services.distractors import part_of_speech
+from services.sampling import sample_alias, word_weight
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, workers may each rebuild
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Touched whenever words are inserted; its mtime is the catalog version, so
+# every worker process (and the import scripts) agree on when to reload
+CATALOG_STAMP_PATH = os.getenv("CATALOG_STAMP_PATH", "./.catalog_stamp")
+
+# Memory-mapped catalog file shared by worker processes (empty: keep it in memory)
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "")
+
+
+def catalog_version() -> int:
+    """Current catalog version (0 if the catalog was never invalidated)"""
+    try:
+        return os.stat(CATALOG_STAMP_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def touch_catalog_stamp():
+    """Bump the catalog version seen by every process"""
+    Path(CATALOG_STAMP_PATH).touch()
+
+
+class WordCatalog:
+    """
+    Word ids partitioned by level tag, loaded once per catalog version.
+
+    The catalog is held as a CatalogSnapshot: flat arrays of ids, plus each
+    word's text and definition, instead of Python objects. Callers sample
+    ids here and hydrate just the chosen rows from the database. Each level
+    is further split by part of speech so distractors can be drawn without
+    scanning the level, and carries an alias table for drawing words by
+    frequency (rebuilt only for levels whose words changed).
+
+    With CATALOG_SNAPSHOT_PATH set, the snapshot is also written to that
+    file and memory-mapped, so worker processes share one copy and a worker
+    starting on an unchanged catalog does not query every word.
+
+    Only the first load blocks. Later versions are built by a background
+    task while requests keep using the loaded catalog, which is swapped
+    for the new one when it is ready.
+    """
+
+    def __init__(self, snapshot_path: str = CATALOG_SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self._lock = asyncio.Lock()
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._partitions: dict[str, Sequence[int]] = {}
+        self._buckets: dict[tuple[str, str], Sequence[int]] = {}
+        self._version: Optional[int] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    @property
+    def is_current(self) -> bool:
+        return self._version is not None and self._version == catalog_version()
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Load the catalog if it is missing; start a background reload if it is stale"""
+        if self.is_current:
+            return
+        if self._snapshot is None:
+            await self._load(db)
+        elif self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        try:
+            async with async_session_maker() as db:
+                await self._load(db)
+        except Exception:
+            # The loaded catalog keeps serving; the next request retries
+            logger.exception("Catalog reload failed")
+
+    async def _load(self, db: AsyncSession):
+        async with self._lock:
+            if self.is_current:
+                return
+            # Read the version first so an import landing mid-load forces a reload
+            version = catalog_version()
+            snapshot = await self._open_saved(db, version)
+            if snapshot is None:
+                # One worker rebuilds the file; the others wait, then map it
+                async with self._file_lock():
+                    snapshot = await self._open_saved(db, version)
+                    if snapshot is None:
+                        words = (await db.exec(self._words_statement())).all()
+                        levels = (await db.exec(self._levels_statement())).all()
+                        snapshot = await asyncio.to_thread(self._build, words, levels, version)
+            self._use(snapshot)
+
+    async def aclose(self):
+        """Stop a background reload (API shutdown)"""
+        if self._refresh is not None:
+            self._refresh.cancel()
+            await asyncio.gather(self._refresh, return_exceptions=True)
+
+    def load(self, db: Session):
+        """Synchronous load from the database, for scripts (refreshes the snapshot file)"""
+        version = catalog_version()
+        words = db.exec(self._words_statement()).all()
+        self._use(self._build(words, db.exec(self._levels_statement()).all(), version))
+
+    async def _open_saved(self, db: AsyncSession, version: int) -> Optional[CatalogSnapshot]:
+        """The snapshot file, if it was written for this catalog version"""
+        if not self.snapshot_path or CatalogSnapshot.read_version(self.snapshot_path) != version:
+            return None
+        try:
+            snapshot = CatalogSnapshot.open(self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable catalog snapshot: %s", e)
+            return None
+        if self._snapshot is None:
+            # First load of this process: the version alone cannot tell a
+            # snapshot of another database apart (e.g. no stamp file yet)
+            count, max_id = (await db.exec(select(func.count(), func.max(Word.id)))).one()
+            if count != len(snapshot) or (count and max_id != snapshot.ids[-1]):
+                logger.info("Catalog snapshot does not match the database, rebuilding")
+                return None
+        logger.info("Mapped catalog snapshot with %d words", len(snapshot))
+        return snapshot
+
+    @asynccontextmanager
+    async def _file_lock(self):
+        if not self.snapshot_path or fcntl is None:
+            yield
+            return
+        with open(f"{self.snapshot_path}.lock", "a") as lock:
+            await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _words_statement():
+        return select(Word.id, Word.text, Word.definition, Word.definition_json, Word.collins, Word.oxford)
+
+    @staticmethod
+    def _levels_statement():
+        # Walks ix_wordlevel_level_word, so partitions come out grouped by level
+        return select(WordLevel.level, WordLevel.word_id).order_by(WordLevel.level, WordLevel.word_id)
+
+    def _build(self, words, levels, version: int) -> CatalogSnapshot:
+        rows = [
+            (word_id, text, definition, part_of_speech(definition_json, definition), word_weight(collins, oxford))
+            for word_id, text, definition, definition_json, collins, oxford in words
+        ]
+        data = build_snapshot(version, rows, levels, previous=self._snapshot)
+        if self.snapshot_path:
+            try:
+                write_snapshot(self.snapshot_path, data)
+                return CatalogSnapshot.open(self.snapshot_path)
+            except OSError as e:
+                logger.warning("Could not write the catalog snapshot, keeping it in memory: %s", e)
+        return CatalogSnapshot(data)
+
+    def _use(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+        self._partitions = snapshot.partitions
+        self._buckets = snapshot.buckets
+        self._version = snapshot.version
+        logger.info("Loaded %d words in %d levels", len(snapshot), len(snapshot.partitions) - 1)
+
+    def invalidate(self):
+        """Mark the catalog stale here and in other processes (reloaded in the background)"""
+        self._version = None
+        touch_catalog_stamp()
+
+    def size(self, level: str = ALL_LEVELS) -> int:
+        return len(self._partitions.get(level, ()))
+
+    def levels(self) -> list[str]:
+        """All level tags, without ALL"""
+        return sorted(level for level in self._partitions if level != ALL_LEVELS)
+
+    def has_word(self, word_id: int) -> bool:
+        """Whether the loaded catalog version includes a word"""
+        return self._snapshot is not None and self._snapshot.pos_of(word_id) is not None
+
+    def levels_of(self, word_id: int) -> tuple[str, ...]:
+        """Level tags of a word (empty if the word is not in the catalog)"""
+        return self._snapshot.levels_of(word_id) if self._snapshot else ()
+
+    def pos_of(self, word_id: int) -> str:
+        """Primary part of speech of a word ('unk.' if not in the catalog)"""
+        pos = self._snapshot.pos_of(word_id) if self._snapshot else None
+        return pos or "unk."
+
+    def definition_of(self, word_id: int) -> Optional[str]:
+        """Definition of a word as of the catalog version (None if not in the catalog)"""
+        return self._snapshot.definition_of(word_id) if self._snapshot else None
+
+    def sample(self, level: str, count: int) -> list[int]:
+        """Pick up to `count` distinct word ids from a level in O(count)"""
+        ids = self._partitions.get(level, [])
+        return random.sample(ids, min(count, len(ids)))
+
+    def sample_weighted(self, level: str, count: int) -> list[int]:
+        """
+        Pick up to `count` distinct word ids from a level, common words
+        (Collins stars, Oxford 3000) more often, in O(count) expected time
+        """
+        if self._snapshot is None or level not in self._snapshot.alias_tables:
+            return []
+        prob, alias = self._snapshot.alias_tables[level]
+        return sample_alias(self._partitions[level], prob, alias, count)
+
+    def sample_excluding(self, level: str, count: int, exclude: int) -> list[int]:
+        """Pick up to `count` distinct word ids from a level, never `exclude`"""
+        ids = self._partitions.get(level, [])
+        picked = random.sample(ids, min(count + 1, len(ids)))
+        return [word_id for word_id in picked if word_id != exclude][:count]
+
+    def sample_bucket(self, level: str, pos: str, count: int, exclude: int) -> list[int]:
+        """Like sample_excluding, restricted to one part of speech within a level"""
+        ids = self._buckets.get((level, pos), [])
+        picked = random.sample(ids, min(count + 1, len(ids)))
+        return [word_id for word_id in picked if word_id != exclude][:count]
+
+
+# Shared instance for the whole process
+word_catalog = WordCatalog()
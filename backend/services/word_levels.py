@@ -0,0 +1,52 @@
+"""
+Voca 语刻 - Word Levels
+Helpers for the WordLevel join table that replaces comma-joined level strings
+"""
+
+import logging
+
+from sqlalchemy import literal
+from sqlmodel import select
+
+from database import upsert
+from models import Word, WordLevel
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH = 1000
+
+
+def split_levels(level) -> list[str]:
+    """'CET4, GRE,CET4' -> ['CET4', 'GRE'] (order kept, blanks dropped)"""
+    return list(dict.fromkeys(t.strip() for t in (level or "").split(",") if t.strip()))
+
+
+def merge_levels(*levels) -> str:
+    """Join level strings into one comma string without duplicates"""
+    return ",".join(split_levels(",".join(level or "" for level in levels)))
+
+
+def add_word_levels(rows: list[dict]):
+    """INSERT of {"word_id", "level"} rows that skips pairs already present"""
+    return upsert(WordLevel.__table__).values(rows).on_conflict_do_nothing()
+
+
+def add_level_by_text(texts: list[str], level: str):
+    """Tag the words with these texts with `level`, in one INSERT ... SELECT"""
+    table = WordLevel.__table__
+    source = select(Word.id, literal(level)).where(Word.text.in_(texts))
+    return upsert(table).from_select(["word_id", "level"], source).on_conflict_do_nothing()
+
+
+def backfill_word_levels(conn):
+    """Fill the wordlevel table from Word.level strings (run by migrate)"""
+    words = conn.execute(select(Word.id, Word.level)).all()
+    rows = [
+        {"word_id": word_id, "level": tag}
+        for word_id, level in words
+        for tag in split_levels(level)
+    ]
+    for start in range(0, len(rows), BACKFILL_BATCH):
+        conn.execute(add_word_levels(rows[start:start + BACKFILL_BATCH]))
+    if rows:
+        logger.info("Backfilled %d word levels for %d words", len(rows), len(words))
@@ -0,0 +1,194 @@
+"""
+Voca 语刻 - Word Search
+As-you-type search over Word.text and the Chinese definition, backed by an
+FTS5 trigram index on SQLite (kept in sync with the word table by triggers)
+"""
+
+import logging
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import func, or_, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import IS_SQLITE
+from models import Word, WordSearchResult
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FUZZY_CANDIDATES = int(os.getenv("SEARCH_FUZZY_CANDIDATES", "200"))  # FTS rows rescored per fuzzy query
+SEARCH_FUZZY_MIN_SIMILARITY = float(os.getenv("SEARCH_FUZZY_MIN_SIMILARITY", "0.3"))  # trigram Jaccard
+
+FTS_TABLE = "word_fts"
+
+# External-content table: the index stores trigrams only, text comes from `word`
+FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, definition, content='word', content_rowid='id', tokenize='trigram')"
+)
+FTS_TRIGGERS = {
+    f"{FTS_TABLE}_ai": (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON word BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, text, definition) VALUES (new.id, new.text, new.definition); "
+        "END"
+    ),
+    f"{FTS_TABLE}_ad": (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON word BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, definition) "
+        "VALUES ('delete', old.id, old.text, old.definition); "
+        "END"
+    ),
+    f"{FTS_TABLE}_au": (
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text, definition ON word BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, definition) "
+        "VALUES ('delete', old.id, old.text, old.definition); "
+        f"INSERT INTO {FTS_TABLE}(rowid, text, definition) VALUES (new.id, new.text, new.definition); "
+        "END"
+    ),
+}
+
+# Best match first; within a kind, higher Collins/Oxford ratings first
+MATCH_ORDER = {"exact": 0, "prefix": 1, "text": 2, "definition": 3, "fuzzy": 4}
+
+
+def ensure_word_fts(conn):
+    """
+    Create the FTS table and its triggers (SQLite only). When any of them
+    was missing the index may lag the word table, so it is rebuilt.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+    existing = {
+        row[0] for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE name = ? OR name LIKE ?", (FTS_TABLE, f"{FTS_TABLE}_a_")
+        )
+    }
+    missing = ({FTS_TABLE} | set(FTS_TRIGGERS)) - existing
+    if not missing:
+        return
+    conn.exec_driver_sql(FTS_DDL)
+    for ddl in FTS_TRIGGERS.values():
+        conn.exec_driver_sql(ddl)
+    rebuild_word_fts(conn)
+
+
+def rebuild_word_fts(conn):
+    """Re-index every word from the word table"""
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    logger.info("Rebuilt the word search index")
+
+
+@contextmanager
+def bulk_load(engine):
+    """
+    Drop the FTS triggers for a large import and rebuild the index once at
+    the end, which is much faster than indexing row by row. If the import
+    dies halfway, the next migrate() restores the triggers and rebuilds.
+    """
+    if engine.dialect.name != "sqlite":
+        yield
+        return
+    with engine.begin() as conn:
+        for name in FTS_TRIGGERS:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    yield
+    with engine.begin() as conn:
+        ensure_word_fts(conn)
+
+
+def trigrams(value: str) -> set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Trigram Jaccard similarity, padded like pg_trgm ("  aple ") so short
+    words with a typo still share their first and last trigrams
+    """
+    a, b = trigrams(f"  {a} "), trigrams(f"  {b} ")
+    return len(a & b) / len(a | b)
+
+
+def fts_phrase(value: str) -> str:
+    """Quote a string as one FTS5 phrase"""
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _result(word, match: str) -> WordSearchResult:
+    return WordSearchResult(
+        id=word.id,
+        text=word.text,
+        definition=word.definition,
+        phonetic=word.phonetic,
+        collins=word.collins,
+        oxford=word.oxford,
+        match=match
+    )
+
+
+async def search_words(db: AsyncSession, q: str, limit: int = 10) -> list[WordSearchResult]:
+    """
+    Top `limit` words for a query, trying in turn:
+
+    1. exact and prefix matches on Word.text (the unique index on text)
+    2. substring matches in the text or Chinese definition (FTS5 trigrams;
+       queries under 3 characters fall back to LIKE on the definition)
+    3. misspellings: words sharing enough trigrams with the query
+
+    Later steps only run while fewer than `limit` words were found.
+    """
+    q = q.strip().lower()
+    if not q:
+        return []
+    # Ratings are NULL on rows from before those columns existed
+    collins = func.coalesce(Word.collins, 0).label("collins")
+    oxford = func.coalesce(Word.oxford, 0).label("oxford")
+    columns = (Word.id, Word.text, Word.definition, Word.phonetic, collins, oxford)
+    ranking = (collins.desc(), oxford.desc(), func.length(Word.text), Word.text)
+    found: dict[int, tuple] = {}  # word_id -> (sort key, result)
+
+    def add(rows, match: str, similarity: float = 0.0):
+        for row in rows:
+            if row.id not in found:
+                key = (MATCH_ORDER[match], -similarity, -row.collins, -row.oxford, len(row.text), row.text)
+                found[row.id] = (key, _result(row, match))
+
+    add((await db.exec(select(*columns).where(Word.text == q))).all(), "exact")
+    # Range scan on the text index, so "ab" never reads words outside ab*
+    add((await db.exec(
+        select(*columns).where(Word.text > q, Word.text < q + "\U0010ffff").order_by(*ranking).limit(limit)
+    )).all(), "prefix")
+
+    if len(found) < limit:
+        if len(q) >= 3 and IS_SQLITE:
+            matched = text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q").bindparams(q=fts_phrase(q))
+            rows = (await db.exec(
+                select(*columns).where(Word.id.in_(matched)).order_by(*ranking).limit(limit * 2)
+            )).all()
+        elif not q.isascii() or not IS_SQLITE:
+            # Short Chinese queries: trigrams need 3 characters, so this scans
+            pattern = f"%{q}%"
+            rows = (await db.exec(
+                select(*columns).where(or_(Word.text.like(pattern), Word.definition.like(pattern)))
+                .order_by(*ranking).limit(limit * 2)
+            )).all()
+        else:
+            rows = []
+        add([r for r in rows if q in r.text.lower()], "text")
+        add(rows, "definition")
+
+    if len(found) < limit and len(q) >= 4 and q.isascii() and IS_SQLITE:
+        # Candidates share at least one trigram with the query; rescored below
+        query = f"text : ({' OR '.join(fts_phrase(t) for t in sorted(trigrams(q)))})"
+        matched = text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q ORDER BY rank LIMIT :n"
+        ).bindparams(q=query, n=SEARCH_FUZZY_CANDIDATES)
+        rows = (await db.exec(select(*columns).where(Word.id.in_(matched)))).all()
+        for row in rows:
+            score = similarity(q, row.text.lower())
+            if score >= SEARCH_FUZZY_MIN_SIMILARITY:
+                add([row], "fuzzy", score)
+
+    ranked = sorted(found.values(), key=lambda item: item[0])
+    return [result for _, result in ranked[:limit]]
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Tests import the backend modules the way main.py does (`from services import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runtime files of the shared engines go to a scratch directory (set before
+# `database` is imported, which reads them once)
+RUNTIME_DIR = tempfile.mkdtemp(prefix="voca-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{RUNTIME_DIR}/voca.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["CATALOG_STAMP_PATH"] = f"{RUNTIME_DIR}/.catalog_stamp"
+os.environ["CATALOG_SNAPSHOT_PATH"] = ""
+os.environ["PROGRESS_JOURNAL_PATH"] = f"{RUNTIME_DIR}/progress.journal"
+
+from sqlmodel import Session  # noqa: E402
+
+from database import async_engine, create_db_and_tables, engine, read_engine  # noqa: E402
+from models import Word, WordLevel  # noqa: E402
+
+# Words every database test can rely on: (text, definition, level)
+WORDS = [
+    ("apple", "n. 苹果", "CET4"),
+    ("banana", "n. 香蕉", "CET4"),
+    ("cherry", "n. 樱桃", "CET4"),
+    ("drift", "v. 漂流", "CET6"),
+    ("eager", "adj. 渴望的", "CET6"),
+    ("fable", "n. 寓言", "GRE"),
+]
+
+
+@pytest.fixture(scope="session")
+def word_ids() -> dict[str, int]:
+    """Create the test database once; text -> id of the seeded words"""
+    create_db_and_tables()
+    with Session(engine) as session:
+        words = [Word(text=text, definition=definition, level=level) for text, definition, level in WORDS]
+        session.add_all(words)
+        session.flush()
+        session.add_all(WordLevel(word_id=w.id, level=w.level) for w in words)
+        session.commit()
+        return {w.text: w.id for w in words}
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a fresh event loop, releasing pooled connections after"""
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await async_engine.dispose()
+                if read_engine is not async_engine:
+                    await read_engine.dispose()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,61 @@
+from services.catalog_snapshot import ALL_LEVELS, CatalogSnapshot, build_snapshot, write_snapshot
+
+WORDS = [
+    (3, "apple", "n. 苹果", "n", 2.0),
+    (1, "eager", "adj. 渴望的", "adj", 1.0),
+    (7, "drift", "v. 漂流", "v", 5.0),
+    (9, "fable", None, "n", 1.0),
+]
+LEVELS = [("CET4", 3), ("CET6", 1), ("CET6", 7), ("GRE", 7), ("GRE", 42)]
+
+
+def test_write_read_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    write_snapshot(path, build_snapshot(12, WORDS, LEVELS))
+
+    assert CatalogSnapshot.read_version(path) == 12
+    snapshot = CatalogSnapshot.open(path)
+    assert snapshot.version == 12
+    assert list(snapshot.ids) == [1, 3, 7, 9]
+    assert list(snapshot.weights) == [1.0, 2.0, 5.0, 1.0]
+    for word_id, text, definition, pos, _ in WORDS:
+        assert snapshot.text_of(word_id) == text
+        assert snapshot.definition_of(word_id) == (definition or "")
+        assert snapshot.pos_of(word_id) == pos
+    assert set(snapshot.levels_of(7)) == {"CET6", "GRE"}
+    assert snapshot.levels_of(9) == ()
+    assert snapshot.text_of(42) is None
+
+    # The GRE row for an unknown word is skipped
+    assert {level: list(ids) for level, ids in snapshot.partitions.items()} == {
+        ALL_LEVELS: [1, 3, 7, 9], "CET4": [3], "CET6": [1, 7], "GRE": [7]
+    }
+    assert list(snapshot.buckets[("CET6", "v")]) == [7]
+    assert list(snapshot.buckets[(ALL_LEVELS, "n")]) == [3, 9]
+    assert set(snapshot.alias_tables) == set(snapshot.fingerprints)
+
+
+def test_unchanged_levels_keep_their_alias_tables():
+    previous = CatalogSnapshot(build_snapshot(1, WORDS, LEVELS))
+    reweighted = [w if w[0] != 3 else w[:4] + (9.0,) for w in WORDS]
+    snapshot = CatalogSnapshot(build_snapshot(2, reweighted, LEVELS, previous=previous))
+
+    assert snapshot.fingerprints["CET6"] == previous.fingerprints["CET6"]
+    assert snapshot.fingerprints["CET4"] != previous.fingerprints["CET4"]
+    for level in ("CET6", "GRE"):
+        assert [bytes(t) for t in snapshot.alias_tables[level]] == [bytes(t) for t in previous.alias_tables[level]]
+
+
+def test_more_than_255_parts_of_speech():
+    words = [(i, f"w{i}", "", f"pos{i:04d}", 1.0) for i in range(1, 302)]
+    snapshot = CatalogSnapshot(build_snapshot(1, words, []))
+    assert len(snapshot.pos_names) == 301
+    assert snapshot.pos_of(300) == "pos0300"
+    assert snapshot.pos_of(1) == "pos0001"
+
+
+def test_other_files_are_not_snapshots(tmp_path):
+    path = tmp_path / "catalog.bin"
+    path.write_bytes(b"VOCACAT1" + bytes(8))
+    assert CatalogSnapshot.read_version(str(path)) is None
+    assert CatalogSnapshot.read_version(str(tmp_path / "missing.bin")) is None
@@ -0,0 +1,33 @@
+from database import async_session_maker
+from models import ProgressBatch, ProgressBatchItem
+from routers.learning import update_progress_batch
+
+
+def apply(run, *answers) -> dict[int, tuple[int, bool]]:
+    """POST /api/progress/batch with (user_id, word_id, correct, seq) answers"""
+    async def main():
+        async with async_session_maker() as db:
+            batch = ProgressBatch(updates=[
+                ProgressBatchItem(user_id=user_id, word_id=word_id, correct=correct, seq=seq)
+                for user_id, word_id, correct, seq in answers
+            ])
+            result = await update_progress_batch(batch, db)
+            await db.commit()
+            return {r.word_id: (r.mastery_count, r.is_mastered) for r in result}
+    return run(main())
+
+
+def test_retried_batch_is_applied_once(run, word_ids):
+    apple, banana = word_ids["apple"], word_ids["banana"]
+    batch = [("batch-retry", apple, True, 1), ("batch-retry", apple, True, 2), ("batch-retry", banana, False, 3)]
+
+    assert apply(run, *batch) == {apple: (2, False), banana: (0, False)}
+    assert apply(run, *batch) == {apple: (2, False), banana: (0, False)}
+    # Only the answer newer than the stored seq counts
+    assert apply(run, ("batch-retry", apple, True, 2), ("batch-retry", apple, True, 4)) == {apple: (3, True)}
+
+
+def test_skipped_answers_on_new_words_are_still_returned(run, word_ids):
+    cherry = word_ids["cherry"]
+    assert apply(run, ("batch-new", cherry, True, 0)) == {cherry: (0, False)}
+    assert apply(run, ("batch-new", cherry, True, 1)) == {cherry: (1, False)}
@@ -0,0 +1,89 @@
+import asyncio
+
+from sqlmodel import select
+
+from database import async_session_maker
+from models import ProgressUpdate, UserProgress
+from services.progress_buffer import ProgressBuffer
+
+
+def answer(user_id: str, word_id: int, correct: bool, seq: int) -> ProgressUpdate:
+    return ProgressUpdate(user_id=user_id, word_id=word_id, correct=correct, seq=seq)
+
+
+async def stored(user_id: str) -> dict[int, tuple[int, int]]:
+    """word_id -> (mastery_count, last_seq) of the user's rows in the database"""
+    async with async_session_maker() as db:
+        rows = (await db.exec(select(UserProgress).where(UserProgress.user_id == user_id))).all()
+        return {p.word_id: (p.mastery_count, p.last_seq) for p in rows}
+
+
+async def apply(buffer: ProgressBuffer, *updates: ProgressUpdate):
+    async with async_session_maker() as db:
+        return await buffer.apply(db, updates)
+
+
+def crash(buffer: ProgressBuffer):
+    """Drop the buffer the way a killed process would: no flush, files left behind"""
+    buffer._flusher.cancel()
+    buffer._journal.close()
+    if buffer._lock_file is not None:
+        buffer._lock_file.close()
+
+
+def test_answers_merge_in_memory_until_flushed(run, word_ids, tmp_path):
+    apple, banana = word_ids["apple"], word_ids["banana"]
+
+    async def main():
+        buffer = ProgressBuffer(str(tmp_path / "progress.journal"), flush_interval=3600)
+        await buffer.start()
+        try:
+            await apply(buffer, answer("buffer-merge", apple, True, 1), answer("buffer-merge", banana, False, 2))
+            states = await apply(buffer, answer("buffer-merge", apple, True, 3), answer("buffer-merge", apple, True, 3))
+            assert states[("buffer-merge", apple)].mastery_count == 2
+            assert {w: s.mastery_count for w, s in buffer.user_states("buffer-merge").items()} == {apple: 2, banana: 0}
+            assert await stored("buffer-merge") == {}
+
+            assert await buffer.flush() == 2
+            assert await stored("buffer-merge") == {apple: (2, 3), banana: (0, 2)}
+            assert buffer.user_states("buffer-merge") == {}
+            # Flushed segments are gone; only the one taking new answers is left
+            assert len(buffer._segments()) == 1
+
+            # A retry of a flushed answer is still skipped
+            states = await apply(buffer, answer("buffer-merge", apple, True, 3))
+            assert states[("buffer-merge", apple)].mastery_count == 2
+        finally:
+            await buffer.aclose()
+        assert buffer._segments() == []
+
+    run(main())
+
+
+def test_journal_is_replayed_after_a_crash(run, word_ids, tmp_path):
+    cherry, drift = word_ids["cherry"], word_ids["drift"]
+    path = str(tmp_path / "progress.journal")
+
+    async def main():
+        buffer = ProgressBuffer(path, flush_interval=3600)
+        await buffer.start()
+        await apply(buffer, answer("buffer-crash", cherry, True, 1), answer("buffer-crash", drift, True, 2))
+        await apply(buffer, answer("buffer-crash", cherry, True, 3))
+        crash(buffer)
+        await asyncio.sleep(0)
+        assert await stored("buffer-crash") == {}
+
+        # A torn last line is skipped, the complete ones before it are kept
+        with open(buffer._segments()[-1][1], "a", encoding="utf-8") as f:
+            f.write('{"user_id": "buffer-crash", "word_id"')
+
+        restarted = ProgressBuffer(path, flush_interval=3600)
+        await restarted.start()
+        try:
+            assert restarted.replayed == 2
+            assert await stored("buffer-crash") == {cherry: (2, 3), drift: (1, 2)}
+            assert len(restarted._segments()) == 1
+        finally:
+            await restarted.aclose()
+
+    run(main())
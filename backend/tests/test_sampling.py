@@ -0,0 +1,48 @@
+import random
+from collections import Counter
+
+import pytest
+
+from services.sampling import build_alias, sample_alias, word_weight
+
+WEIGHTS = [word_weight(5, 1), word_weight(3, 0), word_weight(0, 1), word_weight(None, None), word_weight(1, 0)]
+
+
+def implied(prob, alias) -> list[float]:
+    """Exact draw probability of each index under an alias table"""
+    n = len(prob)
+    p = [0.0] * n
+    for i in range(n):
+        p[i] += prob[i] / n
+        p[alias[i]] += (1.0 - prob[i]) / n
+    return p
+
+
+def test_alias_table_reproduces_the_weights():
+    prob, alias = build_alias(WEIGHTS)
+    total = sum(WEIGHTS)
+    assert implied(prob, alias) == pytest.approx([w / total for w in WEIGHTS], abs=1e-6)
+
+
+def test_uniform_when_all_weights_are_zero():
+    prob, alias = build_alias([0.0, 0.0, 0.0])
+    assert implied(prob, alias) == pytest.approx([1 / 3] * 3)
+
+
+def test_single_draws_follow_the_weights():
+    prob, alias = build_alias(WEIGHTS)
+    ids = [10, 11, 12, 13, 14]
+    random.seed(20240601)
+    draws = Counter(sample_alias(ids, prob, alias, 1)[0] for _ in range(50000))
+    total = sum(WEIGHTS)
+    for word_id, w in zip(ids, WEIGHTS):
+        assert draws[word_id] / 50000 == pytest.approx(w / total, abs=0.01)
+
+
+def test_sample_is_distinct_and_bounded():
+    prob, alias = build_alias(WEIGHTS)
+    ids = [10, 11, 12, 13, 14]
+    picked = sample_alias(ids, prob, alias, 3)
+    assert len(picked) == len(set(picked)) <= 3
+    assert set(picked) <= set(ids)
+    assert sample_alias([], prob, alias, 3) == []
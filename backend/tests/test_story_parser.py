@@ -0,0 +1,31 @@
+from services.ai_service import StorySectionParser, parse_story
+
+REPLY = "[ENGLISH]\nThe eager fox read a fable.\n---\n[CHINESE]\n渴望的狐狸读了一则寓言。\n---\nnotes"
+
+
+def stream(deltas: list[str]) -> tuple[dict, dict]:
+    parser = StorySectionParser()
+    events = [e for d in deltas for e in parser.feed(d)] + parser.close()
+    streamed = {section: "".join(t for s, t in events if s == section).strip() for section in ("english", "chinese")}
+    return streamed, parser.result()
+
+
+def test_whole_reply_matches_parse_story():
+    streamed, result = stream([REPLY])
+    assert result == parse_story(REPLY)
+    assert streamed == {"english": result["content"], "chinese": result["translation"]}
+
+
+def test_markers_split_across_every_chunk_boundary():
+    expected = parse_story(REPLY)
+    for cut in range(1, len(REPLY)):
+        streamed, result = stream([REPLY[:cut], REPLY[cut:]])
+        assert result == expected, cut
+        assert streamed == {"english": expected["content"], "chinese": expected["translation"]}, cut
+
+
+def test_one_character_deltas_never_leak_markers():
+    streamed, result = stream(list(REPLY))
+    assert result == parse_story(REPLY)
+    assert "[" not in streamed["english"] + streamed["chinese"]
+    assert "-" not in streamed["english"] + streamed["chinese"]
@@ -0,0 +1,73 @@
+import json
+
+from sqlmodel import Session, select
+
+from database import async_session_maker, engine
+from models import UserProgress, Word
+from services.sync import changes_since, ndjson
+
+
+def version_of(word_id: int) -> int:
+    with Session(engine) as session:
+        return session.get(Word, word_id).change_version
+
+
+def update_word(word_id: int, **values):
+    with Session(engine) as session:
+        word = session.get(Word, word_id)
+        for name, value in values.items():
+            setattr(word, name, value)
+        session.commit()
+
+
+def test_paging_returns_every_change_once(run, word_ids):
+    with Session(engine) as session:
+        session.add_all(
+            UserProgress(user_id="sync-paging", word_id=word_id, mastery_count=1)
+            for word_id in (word_ids["apple"], word_ids["eager"])
+        )
+        session.commit()
+
+    async def main():
+        pages = []
+        since, more = 0, True
+        async with async_session_maker() as db:
+            while more:
+                lines, version, more = await changes_since(db, since, "sync-paging", limit=2)
+                assert len(lines) <= 2
+                if lines:
+                    assert since < lines[0]["v"] and version == lines[-1]["v"]
+                pages.append(lines)
+                since = version
+            # Nothing new: same version back, nothing waiting
+            assert await changes_since(db, since, "sync-paging", limit=2) == ([], since, False)
+        return pages
+
+    lines = [line for page in run(main()) for line in page]
+    versions = [line["v"] for line in lines]
+    assert versions == sorted(versions) and len(set(versions)) == len(versions)
+    assert sorted(line["id"] for line in lines if line["t"] == "word") == sorted(word_ids.values())
+    assert sorted(line["word_id"] for line in lines if line["t"] == "progress") == sorted(
+        [word_ids["apple"], word_ids["eager"]]
+    )
+
+
+def test_only_synced_columns_bump_the_version(word_ids):
+    fable = word_ids["fable"]
+    before = version_of(fable)
+
+    update_word(fable, options=json.dumps(["a", "b", "c"]))
+    assert version_of(fable) == before
+
+    update_word(fable, definition="n. 寓言故事")
+    bumped = version_of(fable)
+    assert bumped > before
+    with Session(engine) as session:
+        assert bumped == max(session.exec(select(Word.change_version)).all())
+
+
+def test_ndjson_ends_with_a_compact_summary():
+    lines = [{"t": "word", "v": 3, "id": 1, "text": "apple"}]
+    out = b"".join(ndjson(lines, 3, True)).decode().splitlines()
+    assert [json.loads(line) for line in out] == lines + [{"t": "end", "version": 3, "more": True, "count": 1}]
+    assert out[-1] == '{"t":"end","version":3,"more":true,"count":1}'
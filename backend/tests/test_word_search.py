@@ -0,0 +1,67 @@
+import asyncio
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import migrate
+from services.word_search import search_words
+
+# The word table as it was before Collins/Oxford ratings were added
+OLD_WORD_TABLE = """
+CREATE TABLE word (
+    id INTEGER NOT NULL,
+    text VARCHAR NOT NULL,
+    definition VARCHAR NOT NULL,
+    level VARCHAR NOT NULL,
+    phonetic VARCHAR,
+    options VARCHAR,
+    PRIMARY KEY (id)
+)
+"""
+OLD_WORDS = [
+    (1, "apple", "n. 苹果", "CET4"),
+    (2, "applause", "n. 鼓掌", "CET6"),
+    (3, "apply", "v. 申请", "CET4"),
+    (4, "pineapple", "n. 菠萝", "CET6"),
+]
+
+
+def migrated_database(path) -> str:
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(OLD_WORD_TABLE)
+        conn.exec_driver_sql("CREATE UNIQUE INDEX ix_word_text ON word (text)")
+        for row in OLD_WORDS:
+            conn.exec_driver_sql(
+                "INSERT INTO word (id, text, definition, level) VALUES (?, ?, ?, ?)", row
+            )
+    with engine.begin() as conn:
+        migrate(conn)
+        # A row whose ratings were never filled in
+        conn.exec_driver_sql("UPDATE word SET collins = NULL, oxford = NULL WHERE id = 3")
+    engine.dispose()
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def search(url: str, q: str) -> list:
+    async def run():
+        engine = create_async_engine(url)
+        try:
+            async with AsyncSession(engine) as db:
+                return await search_words(db, q)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+def test_search_on_migrated_database(tmp_path):
+    url = migrated_database(tmp_path / "voca.db")
+
+    results = search(url, "appl")
+    assert [r.text for r in results][:3] == ["apple", "apply", "applause"]
+    assert all(r.collins == 0 and r.oxford == 0 for r in results)
+
+    assert [r.match for r in search(url, "apple")][:2] == ["exact", "text"]
+    assert search(url, "苹果")[0].text == "apple"
+    assert search(url, "appel")[0].text == "apple"
@@ -1,6 +1,8 @@
 /// Voca 语刻 - API Client
 /// Dio HTTP client for backend communication
 
+import 'dart:convert';
+
 import 'package:dio/dio.dart';
 import '../models/models.dart';
 
@@ -98,6 +100,65 @@ class ApiClient {
       throw ApiException('Failed to translate: $e');
     }
   }
+  
+  /// Translate many words in one request (e.g. words tapped in a passage).
+  /// Returns one entry per distinct word; `definition` is null when
+  /// `source` is `not_found` or `error`.
+  Future<List<Map<String, String?>>> translateWords(List<String> words) async {
+    try {
+      final response = await _dio.post('/translate/batch', data: {
+        'words': words,
+      });
+      return (response.data as List)
+          .map((json) => {
+                'query': json['query'] as String,
+                'word': json['word'] as String,
+                'definition': json['definition'] as String?,
+                'source': json['source'] as String,
+              })
+          .toList();
+    } catch (e) {
+      throw ApiException('Failed to translate: $e');
+    }
+  }
+  
+  /// Words (and the user's progress) changed since [since], in version order.
+  /// Each row is a map with `t` (`word` or `progress`) and version `v`; pass
+  /// `version` back as [since] next time, and call again while `more` is true.
+  Future<SyncPage> syncChanges({int since = 0, String? userId}) async {
+    try {
+      final response = await _dio.get<String>(
+        '/sync',
+        queryParameters: {
+          'since': since,
+          if (userId != null) 'user_id': userId,
+        },
+        options: Options(responseType: ResponseType.plain),
+      );
+      final lines = const LineSplitter()
+          .convert(response.data ?? '')
+          .where((line) => line.isNotEmpty)
+          .map((line) => jsonDecode(line) as Map<String, dynamic>)
+          .toList();
+      final end = lines.removeLast();
+      return SyncPage(
+        rows: lines,
+        version: end['version'] as int,
+        more: end['more'] as bool,
+      );
+    } catch (e) {
+      throw ApiException('Failed to sync: $e');
+    }
+  }
+}
+
+/// One response of /api/sync
+class SyncPage {
+  final List<Map<String, dynamic>> rows;
+  final int version;
+  final bool more;
+  
+  SyncPage({required this.rows, required this.version, required this.more});
 }
 
 class ApiException implements Exception {